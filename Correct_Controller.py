@@ -280,8 +280,14 @@ Motor Controller Class
 Provides interface to control motors and get distance measurements via Arduino
 """
 
+import re
 import serial
+import threading
 import time
+from array import array
+
+# Distances in a telemetry line, matched on the raw bytes
+DIST_PATTERN = re.compile(rb"Dist1\(cm\):(-?[\d.]+),Dist2\(cm\):(-?[\d.]+)")
 
 class MotorController:
     def __init__(self, port='/dev/ttyACM0', baudrate=115200, timeout=0.1):
@@ -294,6 +300,15 @@ class MotorController:
             timeout: Read timeout in seconds
         """
         self.arduino = None
+        
+        # Newest (d1, d2), written by the reader thread; NaN until the first
+        # reading. Whole-array assignment and tolist() are single C calls,
+        # so readers never see half of an update.
+        self._latest = array('d', [float('nan'), float('nan')])
+        self._fresh = threading.Event()  # Set when a reading arrives
+        self._reader = None
+        self._reading = False
+        
         self.connect(port, baudrate, timeout)
     
     def connect(self, port='/dev/ttyACM0', baudrate=115200, timeout=0.1):
@@ -315,6 +330,11 @@ class MotorController:
             # Clear initial buffer
             self.arduino.flushInput()
             
+            # Read the distances on a background thread from here on
+            self._reading = True
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
+            
             return True
         except serial.SerialException as e:
             print(f"Error connecting to Arduino: {e}")
@@ -342,8 +362,6 @@ class MotorController:
             # Send RPM values as comma-separated string with newline
             message = f"{rpm1},{rpm2}\n"
             self.arduino.write(message.encode('utf-8'))
-            time.sleep(0.2)
-            self.arduino.flushInput()
             
             return True
             
@@ -351,33 +369,33 @@ class MotorController:
             print(f"Error setting RPM: {e}")
             return False
     
+    def _read_loop(self):
+        """Reader thread: parse the Arduino's periodic output into self._latest"""
+        while self._reading:
+            try:
+                m = DIST_PATTERN.search(self.arduino.readline())  # Blocks up to the read timeout
+                if m:
+                    self._latest[:] = array('d', (float(m.group(1)), float(m.group(2))))
+                    self._fresh.set()
+            except ValueError:
+                continue  # Line cut off mid-number
+            except Exception as e:
+                if self._reading:
+                    print(f"Error reading distance: {e}")
+                break
+    
     def getDist(self):
         """
         Get current distance measurements from both motors
-        Reads the periodic output from Arduino
+        Returns the reader thread's newest reading, without touching the port
         
         Returns:
-            tuple: (distanceCm1, distanceCm2) or (None, None) if error
+            tuple: (distanceCm1, distanceCm2) or (None, None) if no reading yet
         """
-        if self.arduino is None:
-            return None, None
-        
-        try:
-            if self.arduino.in_waiting > 0:
-                line = self.arduino.readline().decode('utf-8').strip()
-                if "Dist1(cm):" in line:
-                    parts = line.split(',')
-                    d1, d2 = None, None
-                    for part in parts:
-                        if "Dist1(cm):" in part:
-                            d1 = float(part.split(':')[1])
-                        elif "Dist2(cm):" in part:
-                            d2 = float(part.split(':')[1])
-                    return d1, d2
-            return None, None
-        except Exception as e:
-            print(f"Error reading distance: {e}")
+        d1, d2 = self._latest.tolist()
+        if d1 != d1:  # NaN: nothing read yet
             return None, None
+        return d1, d2
     
     def setBothMotors(self, rpm1, rpm2, time1, time2):
         """
@@ -417,6 +435,10 @@ class MotorController:
                 self.arduino.write(f"{rpm1},0\n".encode('utf-8'))
                 motor2_stopped = True
             
+            # Wait for the next reading instead of spinning on getDist()
+            self._fresh.wait(0.1)
+            self._fresh.clear()
+            
             # Get distance readings
             d1, d2 = self.getDist()
             if d1 is not None:
@@ -446,6 +468,10 @@ class MotorController:
         """
         if self.arduino and self.arduino.is_open:
             self.stop()
+            self._reading = False
+            if self._reader is not None:
+                self._reader.join()  # Returns within one read timeout
+                self._reader = None
             self.arduino.close()
             print("Arduino connection closed")
     
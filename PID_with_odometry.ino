@@ -17,7 +17,31 @@ const float COUNTS_PER_REVOLUTION = 349.2;
 
 // Wheel diameter in cm
 const float WHEEL_DIAMETER_CM = 18.6;
-const float WHEEL_CIRCUMFERENCE_CM = WHEEL_DIAMETER_CM * 3.14159265359;
+const float WHEEL_CIRCUMFERENCE_CM = WHEEL_DIAMETER_CM * PI;
+
+// Conversion factors, computed once instead of dividing every control period
+const float CM_PER_COUNT = WHEEL_CIRCUMFERENCE_CM / COUNTS_PER_REVOLUTION;
+const float RPM_PER_COUNT = 60.0 / (0.1 * COUNTS_PER_REVOLUTION);  // counts per 100ms -> RPM
+
+// Serial speed. Kept at 115200 on purpose: every Python opener
+// (MotorController, properD_calculation, Correct_Controller, simple_motor,
+// single_distance_value, motor_runner and the GUIs) opens the port at this
+// rate. 500000 would move a telemetry line in about a quarter of the wire
+// time, but only if it is changed here and in all of them together.
+#define SERIAL_BAUD 115200
+
+// Telemetry format: 0 = ASCII lines (Serial Plotter and the Python scripts),
+// 1 = 6-byte binary frames [0xAA][dist1 mm int16][dist2 mm int16][xor of the
+// 4 distance bytes], both little-endian. Must match BINARY_TELEMETRY in
+// properD_calculation.py and the binary option of MotorController.
+#define BINARY_TELEMETRY 0
+const byte FRAME_SYNC = 0xAA;
+
+// Frame distances are computed from the counts in Q16 fixed point (the AVR has
+// no FPU). Counts are clamped so count * MM_PER_COUNT_Q16 fits in a long; that
+// is exactly the int16 mm range of a frame.
+const long MM_PER_COUNT_Q16 = (long)(CM_PER_COUNT * 10.0 * 65536.0 + 0.5);
+const long MAX_FRAME_COUNT = 32767L * 65536L / MM_PER_COUNT_Q16;
 
 // Motor 1 variables
 volatile long encoderCount1 = 0;
@@ -62,7 +86,7 @@ void onEncoderA2() {
 }
 
 void setup() {
-  Serial.begin(115200);
+  Serial.begin(SERIAL_BAUD);
   
   // Set pin modes for Motor 1
   pinMode(PWM_PIN1, OUTPUT);
@@ -114,10 +138,15 @@ void checkSerialCommands() {
       targetRpm1 = rpm1;
       targetRpm2 = -rpm2;  // Invert the sign of motor 2's target RPM
       
+#if !BINARY_TELEMETRY
       // Send back the current distances
       Serial.print(distanceCm1, 2);
       Serial.print(",");
       Serial.println(distanceCm2, 2);
+#endif
+      
+      // Tell the Raspberry Pi the command has been applied
+      Serial.println("ACK");
     }
   }
 }
@@ -145,8 +174,7 @@ void loop() {
     
     // Calculate RPM for motor 1
     long deltaCount1 = currentCount1 - prevEncoderCount1;
-    float deltaTime = 0.1;  // 100ms = 0.1s
-    float rpm1 = (deltaCount1 / deltaTime) / COUNTS_PER_REVOLUTION * 60.0;
+    float rpm1 = deltaCount1 * RPM_PER_COUNT;
     prevEncoderCount1 = currentCount1;
     
     // Apply low-pass filter
@@ -177,8 +205,7 @@ void loop() {
     setMotor(dir1, pwmVal1, PWM_PIN1, DIR_PIN1);
 
     // Calculate distance traveled for motor 1
-    float revolutions1 = currentCount1 / COUNTS_PER_REVOLUTION;
-    distanceCm1 = revolutions1 * WHEEL_CIRCUMFERENCE_CM;
+    distanceCm1 = currentCount1 * CM_PER_COUNT;
 
     // ========== Motor 2 Control ==========
     long currentCount2;
@@ -188,7 +215,7 @@ void loop() {
     
     // Calculate RPM for motor 2
     long deltaCount2 = currentCount2 - prevEncoderCount2;
-    float rpm2 = (deltaCount2 / deltaTime) / COUNTS_PER_REVOLUTION * 60.0;
+    float rpm2 = deltaCount2 * RPM_PER_COUNT;
     prevEncoderCount2 = currentCount2;
     
     // Apply low-pass filter
@@ -218,9 +245,11 @@ void loop() {
     setMotor(dir2, pwmVal2, PWM_PIN2, DIR_PIN2);
 
     // Calculate distance traveled for motor 2
-    float revolutions2 = currentCount2 / COUNTS_PER_REVOLUTION;
-    distanceCm2 = revolutions2 * WHEEL_CIRCUMFERENCE_CM;
+    distanceCm2 = currentCount2 * CM_PER_COUNT;
 
+#if BINARY_TELEMETRY
+    sendTelemetryFrame();
+#else
     // Output for Serial Plotter and Monitor
     Serial.print("Target1:");
     Serial.print(targetRpm1, 2);
@@ -234,9 +263,31 @@ void loop() {
     Serial.print(distanceCm1, 2);
     Serial.print(",Dist2(cm):");
     Serial.println(distanceCm2, 2);
+#endif
   }
 }
 
+#if BINARY_TELEMETRY
+int16_t countToMm(long count) {
+  count = constrain(count, -MAX_FRAME_COUNT, MAX_FRAME_COUNT);
+  return (int16_t)((count * MM_PER_COUNT_Q16) >> 16);
+}
+
+void sendTelemetryFrame() {
+  // Distances in mm from the cumulative counts (the Python side subtracts the
+  // start reading), clamped to the int16 range (+-32 m)
+  int16_t d1 = countToMm(prevEncoderCount1);
+  int16_t d2 = countToMm(prevEncoderCount2);
+  
+  byte frame[6];
+  frame[0] = FRAME_SYNC;
+  memcpy(frame + 1, &d1, 2);  // AVR is little-endian
+  memcpy(frame + 3, &d2, 2);
+  frame[5] = frame[1] ^ frame[2] ^ frame[3] ^ frame[4];
+  Serial.write(frame, sizeof(frame));
+}
+#endif
+
 void setMotor(int dir, int pwmVal, int pwm, int dirPin) {
   digitalWrite(dirPin, dir);
   analogWrite(pwm, pwmVal);
@@ -2,6 +2,8 @@ import pigpio
 import time
 import threading
 
+from motor_core import EdgeCounter
+
 ENCA = 17
 ENCB = 27
 PWM_PIN = 18
@@ -13,14 +15,23 @@ pi.set_mode(ENCB, pigpio.INPUT)
 pi.set_pull_up_down(ENCA, pigpio.PUD_UP)
 pi.set_pull_up_down(ENCB, pigpio.PUD_UP)
 
+# Ignore level changes shorter than 150 us (contact bounce); filtered in
+# pigpiod, so bounces never reach encoder_cb
+GLITCH_FILTER_US = 150
+pi.set_glitch_filter(ENCA, GLITCH_FILTER_US)
+pi.set_glitch_filter(ENCB, GLITCH_FILTER_US)
+
 pi.set_mode(PWM_PIN, pigpio.OUTPUT)
 pi.set_mode(DIR_PIN, pigpio.OUTPUT)
 pi.write(DIR_PIN, 1)
 
 PPR = 20
+COUNTS_PER_REV = 4 * PPR  # every edge of A and B is counted (x4 decoding)
 target_rpm = 30
 
-encoder_count = 0
+# Forward and reverse quadrature steps, counted without a lock
+steps_fwd = EdgeCounter()
+steps_rev = EdgeCounter()
 rpm = 0
 
 Kp = 1.2
@@ -29,35 +40,52 @@ Ki = 0.4
 integral = 0
 running = True
 
+# Quadrature step for each (previous state, new state) pair, indexed by
+# (prev << 2) | state where state = (A << 1) | B. Forward is 00->01->11->10;
+# 0 for no change or an invalid (skipped) transition.
+QUAD_DELTA = (
+     0,  1, -1,  0,
+    -1,  0,  0,  1,
+     1,  0,  0, -1,
+     0, -1,  1,  0,
+)
+
+# Current (A << 1) | B, tracked from the callback levels instead of read back
+enc_state = (pi.read(ENCA) << 1) | pi.read(ENCB)
+
 def encoder_cb(gpio, level, tick):
-    global encoder_count
-    a = pi.read(ENCA)
-    b = pi.read(ENCB)
-    if a == b:
-        encoder_count += 1
+    global enc_state
+    if gpio == ENCA:
+        state = (level << 1) | (enc_state & 1)
     else:
-        encoder_count -= 1
+        state = (enc_state & 2) | level
+    delta = QUAD_DELTA[(enc_state << 2) | state]
+    if delta > 0:
+        steps_fwd.increment()
+    elif delta < 0:
+        steps_rev.increment()
+    enc_state = state
 
 pi.callback(ENCA, pigpio.EITHER_EDGE, encoder_cb)
 pi.callback(ENCB, pigpio.EITHER_EDGE, encoder_cb)
 
 def rpm_task():
-    global encoder_count, rpm
-    last = time.time()
+    global rpm
+    last = time.monotonic()
     while running:
         time.sleep(0.1)
-        now = time.time()
+        now = time.monotonic()
         dt = now - last
         last = now
 
-        count = encoder_count
-        encoder_count = 0
+        count = steps_fwd.take() - steps_rev.take()
 
-        revs = (count / PPR) / dt
+        revs = (count / COUNTS_PER_REV) / dt
         rpm = revs * 60
 
 def control_task():
     global integral, rpm
+    deadline = time.monotonic()
     while running:
         error = target_rpm - rpm
         integral += error * 0.1
@@ -68,7 +96,10 @@ def control_task():
         pi.hardware_PWM(PWM_PIN, 20000, int(duty * 10000))
 
         print(f"RPM = {rpm:.1f} | duty = {duty:.1f}%")
-        time.sleep(0.1)
+        deadline += 0.1
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
 
 t1 = threading.Thread(target=rpm_task, daemon=True)
 t2 = threading.Thread(target=control_task, daemon=True)
@@ -23,6 +23,8 @@ import threading
 import sys
 import signal
 
+from motor_core import EdgeCounter, tune_socket_buffers
+
 # ========= USER CONFIG =========
 ENCA = 17
 ENCB = 27
@@ -34,6 +36,13 @@ CPR = 676          # counts per revolution (pulses on ENCA per rev)
 SAMPLE_INTERVAL = 0.1   # seconds
 PWM_FREQ = 20000        # Hz
 
+# Encoder level changes shorter than this are ignored as bounce (us); filtered
+# in pigpiod before the callback runs
+GLITCH_FILTER_US = 150
+
+# Encoder edges in one SAMPLE_INTERVAL -> RPM, computed once
+RPM_PER_COUNT = 60.0 / (CPR * SAMPLE_INTERVAL)
+
 # PI GAINS (tune these!)
 Kp = 1.2
 Ki = 0.4
@@ -46,14 +55,14 @@ target_rpm = 30.0
 
 # ========= GLOBALS =========
 pi = None
-_encoder_count = 0
-_encoder_lock = threading.Lock()
+_encoder_edges = EdgeCounter()  # ENCA rising edges, counted without a lock
 
 current_rpm = 0.0
 _integral = 0.0
 _duty = 0.0
 
-running = True
+# Set to stop the loops; they wait on it, so they wake up at once
+stop_event = threading.Event()
 
 
 # ========= ENCODER CALLBACK =========
@@ -63,36 +72,36 @@ def encoder_callback(gpio, level, tick):
     Direction is controlled separately via DIR_PIN, so we only
     need speed magnitude here.
     """
-    global _encoder_count
     if level == 1:  # rising edge
-        with _encoder_lock:
-            _encoder_count += 1
+        _encoder_edges.increment()
 
 
 # ========= RPM COMPUTATION THREAD =========
 def rpm_loop():
-    global _encoder_count, current_rpm
-    while running:
-        time.sleep(SAMPLE_INTERVAL)
-        with _encoder_lock:
-            count = _encoder_count
-            _encoder_count = 0
+    global current_rpm
+    # Absolute deadlines, so the loop's own work doesn't stretch the interval
+    deadline = time.monotonic()
+    while True:
+        deadline += SAMPLE_INTERVAL
+        if stop_event.wait(max(0.0, deadline - time.monotonic())):
+            break
+        count = _encoder_edges.take()
 
-        # revolutions during this interval = count / CPR
-        revs = count / float(CPR)
-        # RPM = revs per second * 60 = (revs / dt) * 60
-        rpm = (revs / SAMPLE_INTERVAL) * 60.0
-        current_rpm = rpm
+        # RPM = (count / CPR) revs per SAMPLE_INTERVAL, scaled to a minute
+        current_rpm = count * RPM_PER_COUNT
 
 
 # ========= PI CONTROL THREAD =========
 def control_loop():
     global _integral, _duty, current_rpm, target_rpm
 
-    last_print = time.time()
+    last_print = time.monotonic()
+    deadline = last_print
 
-    while running:
-        time.sleep(SAMPLE_INTERVAL)
+    while True:
+        deadline += SAMPLE_INTERVAL
+        if stop_event.wait(max(0.0, deadline - time.monotonic())):
+            break
 
         error = target_rpm - current_rpm
         _integral += error * SAMPLE_INTERVAL
@@ -118,9 +127,9 @@ def control_loop():
         set_pwm_duty(duty)
 
         # Periodic debug print
-        if time.time() - last_print > 0.5:
+        if deadline - last_print > 0.5:
             print(f"RPM = {current_rpm:7.2f} | target = {target_rpm:7.2f} | duty = {duty:6.1f}%")
-            last_print = time.time()
+            last_print = deadline
 
 
 # ========= PWM & DIRECTION HELPERS =========
@@ -151,12 +160,14 @@ def setup():
     if not pi.connected:
         print("ERROR: pigpio daemon not running. Start it with: sudo systemctl start pigpiod")
         sys.exit(1)
+    tune_socket_buffers(pi)  # encoder callbacks arrive on the notification socket
 
     # Encoder pins
     pi.set_mode(ENCA, pigpio.INPUT)
     pi.set_mode(ENCB, pigpio.INPUT)
     pi.set_pull_up_down(ENCA, pigpio.PUD_UP)
     pi.set_pull_up_down(ENCB, pigpio.PUD_UP)
+    pi.set_glitch_filter(ENCA, GLITCH_FILTER_US)
 
     # Motor pins
     pi.set_mode(PWM_PIN, pigpio.OUTPUT)
@@ -177,6 +188,7 @@ def cleanup():
     try:
         set_pwm_duty(0.0)
         pi.write(DIR_PIN, 0)
+        pi.set_glitch_filter(ENCA, 0)
         pi.stop()
     except Exception:
         pass
@@ -185,9 +197,9 @@ def cleanup():
 
 # ========= USER INPUT LOOP =========
 def user_input_loop():
-    global target_rpm, running
+    global target_rpm
 
-    while running:
+    while not stop_event.is_set():
         try:
             line = input("> ").strip()
         except EOFError:
@@ -200,7 +212,7 @@ def user_input_loop():
         cmd = parts[0].lower()
 
         if cmd == "q":
-            running = False
+            stop_event.set()
             break
 
         elif cmd == "s" and len(parts) >= 2:
@@ -224,14 +236,12 @@ def user_input_loop():
 
 # ========= SIGNAL HANDLER =========
 def sigint_handler(sig, frame):
-    global running
     print("\nSIGINT received, stopping...")
-    running = False
+    stop_event.set()
 
 
 # ========= MAIN =========
 def main():
-    global running
     signal.signal(signal.SIGINT, sigint_handler)
 
     setup()
@@ -246,8 +256,9 @@ def main():
     try:
         user_input_loop()
     finally:
-        running = False
-        time.sleep(0.2)  # let threads finish
+        stop_event.set()
+        t_rpm.join()  # control loop must not write PWM after cleanup
+        t_ctrl.join()
         cleanup()
 
 
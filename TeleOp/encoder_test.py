@@ -1,57 +1,74 @@
 #!/usr/bin/env python3
-import RPi.GPIO as GPIO
+"""
+Encoder test: prints the rising-edge counts of both motor encoders.
+
+Edges are timestamped by pigpiod's DMA sampler and delivered through pigpio
+callbacks, so fast edges aren't lost the way they can be with RPi.GPIO's
+per-edge Python interrupt thread.
+
+Requires pigpiod running: sudo systemctl enable --now pigpiod
+"""
+import pigpio
 import time
 
 ENC1_PIN = 17   # Motor 1 encoder A
 ENC2_PIN = 27   # Motor 2 encoder A
 
+PRINT_INTERVAL = 0.5  # seconds
+
+# Level changes shorter than this are ignored as contact bounce (us). Filtered
+# in pigpiod's sampler, so bounces never reach the callbacks. Kept well under
+# the shortest real pulse (a 1 ms filter would drop edges above ~500 Hz).
+GLITCH_FILTER_US = 150
+
 enc1_count = 0
 enc2_count = 0
 
-def enc1_callback(channel):
+def enc1_callback(gpio, level, tick):
     global enc1_count
     enc1_count += 1
 
-def enc2_callback(channel):
+def enc2_callback(gpio, level, tick):
     global enc2_count
     enc2_count += 1
 
 def main():
     global enc1_count, enc2_count
 
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
+    pi = pigpio.pi()
+    if not pi.connected:
+        print("Error: pigpiod not running. Start with: sudo systemctl enable --now pigpiod")
+        return
 
     # Set pins as inputs with pull-ups
-    GPIO.setup(ENC1_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    GPIO.setup(ENC2_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    for pin in (ENC1_PIN, ENC2_PIN):
+        pi.set_mode(pin, pigpio.INPUT)
+        pi.set_pull_up_down(pin, pigpio.PUD_UP)
+        pi.set_glitch_filter(pin, GLITCH_FILTER_US)
 
-    try:
-        GPIO.add_event_detect(ENC1_PIN, GPIO.RISING, callback=enc1_callback, bouncetime=1)
-        GPIO.add_event_detect(ENC2_PIN, GPIO.RISING, callback=enc2_callback, bouncetime=1)
-    except RuntimeError as e:
-        print("\nFAILED TO ADD EDGE DETECT!")
-        print("Common reasons:")
-        print(" 1) Not running with sudo")
-        print(" 2) Pin not set as INPUT before add_event_detect")
-        print(" 3) Another process already using this GPIO")
-        print(" 4) Wrong pin numbering mode (BCM vs BOARD)")
-        print("Error message:", e)
-        GPIO.cleanup()
-        return
+    cb1 = pi.callback(ENC1_PIN, pigpio.RISING_EDGE, enc1_callback)
+    cb2 = pi.callback(ENC2_PIN, pigpio.RISING_EDGE, enc2_callback)
 
     print("Encoder test running. Rotate motors and watch counts.")
     print("Press Ctrl+C to quit.\n")
 
     try:
+        deadline = time.monotonic()
         while True:
             print(f"Enc1 = {enc1_count:6d} | Enc2 = {enc2_count:6d}")
-            time.sleep(0.5)
+            deadline += PRINT_INTERVAL
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
     except KeyboardInterrupt:
         print("\nStopping encoder test...")
     finally:
-        GPIO.cleanup()
-        print("GPIO cleaned up.")
+        cb1.cancel()
+        cb2.cancel()
+        for pin in (ENC1_PIN, ENC2_PIN):
+            pi.set_glitch_filter(pin, 0)
+        pi.stop()
+        print("pigpio connection closed.")
 
 if __name__ == "__main__":
     main()
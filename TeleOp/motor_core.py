@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+motor_core.py
+
+Shared motor core for the TeleOp controllers (motor_gui_control.py and
+motor_keyboard_control.py): the pigpiod connection, Motor, and the
+MotorBank ramp scheduler that gives every motor a trapezoidal speed ramp.
+
+PWM is generated by the BCM2711 PWM peripheral through pigpio's hardware_PWM.
+Pins on the same PWM channel (12/18 or 13/19) always share one duty cycle.
+
+Requires pigpiod running: sudo systemctl enable --now pigpiod
+
+The ramp scheduler runs as a SCHED_FIFO thread with the process memory locked.
+To allow that without sudo, grant the capabilities to the interpreter once:
+  sudo setcap cap_sys_nice,cap_ipc_lock=eip $(readlink -f $(which python3))
+"""
+import pigpio
+import atexit
+import ctypes
+import functools
+import itertools
+import os
+import socket
+import struct
+import threading
+import time
+
+PWM_FREQ = 1000  # 1 kHz
+PWM_RANGE = 1_000_000  # pigpio hardware_PWM duty range (100% = 1,000,000)
+
+# Speed levels (duty cycle %)
+SPEED_LEVELS = {
+    1: 20,
+    2: 40,
+    3: 60,
+    4: 80,
+    5: 100,
+}
+
+# Fixed speed used for turns (and the Z-axis) - level 2
+LEVEL2_SPEED = SPEED_LEVELS[2]
+
+# Ramping parameters
+RAMP_TIME = 0.5  # 500ms for acceleration/deceleration
+RAMP_STEPS = 50  # Number of steps in ramp
+STEP_DELAY = RAMP_TIME / RAMP_STEPS  # Time per step
+
+# Ramp fraction for each step (0.0 .. 1.0), computed once instead of per step
+_FRACTIONS = tuple(k / RAMP_STEPS for k in range(RAMP_STEPS + 1))
+
+
+@functools.lru_cache(maxsize=64)
+def ramp_profile(start_speed, target_speed):
+    """
+    Precomputed ramp from start_speed to target_speed (duty %).
+    Returns (speeds, duties): the duty % and the pigpio duty value for every
+    step. Most ramps run between 0 and a SPEED_LEVELS value, so they are
+    computed once and reused.
+    """
+    speed_diff = target_speed - start_speed
+    speeds = tuple(start_speed + speed_diff * fraction for fraction in _FRACTIONS)
+    duties = tuple(int(speed * PWM_RANGE / 100) for speed in speeds)
+    return speeds, duties
+
+
+# Process-wide pigpiod connection, see get_pi()
+_pi = None
+
+# pigpiod handles one command at a time per connection; serialize PWM updates
+# from the scheduler thread and the UI thread so they don't interleave
+_pwm_lock = threading.Lock()
+
+# Source of ramp generation numbers (next() on a count is atomic under the GIL)
+_generations = itertools.count(1)
+
+# Submitted command that stops every motor without ramping (see MotorBank.emergency_stop)
+_STOP_ALL = object()
+
+PR_SET_TIMERSLACK = 29  # from <linux/prctl.h>
+MCL_CURRENT = 1  # from <sys/mman.h>
+MCL_FUTURE = 2
+RT_PRIORITY = 80  # SCHED_FIFO priority of the ramp scheduler thread
+
+# Kept open for the life of the process; closing it restores C-states
+_cpu_dma_latency_fd = None
+
+# Minimum send/receive buffer for the pigpiod command and notification sockets
+SOCKET_BUF_SIZE = 16 * 1024
+
+
+def get_pi():
+    """
+    Return the pigpiod connection shared by every motor in the process,
+    opening it on first use. It is closed automatically at exit.
+    """
+    global _pi
+    if _pi is None:
+        pi = pigpio.pi()
+        if not pi.connected:
+            raise RuntimeError("pigpiod not running. Start with: sudo systemctl enable --now pigpiod")
+        atexit.register(pi.stop)
+        tune_socket_buffers(pi)
+        _pi = pi
+    return _pi
+
+
+def tune_socket_buffers(pi):
+    """
+    Make sure the pigpiod command and notification (callback) sockets have at
+    least SOCKET_BUF_SIZE of send/receive buffer, so bursts of encoder
+    notifications don't back up into pigpiod. Larger system defaults are kept.
+    """
+    socks = [pi.sl.s]
+    notify = getattr(pi, '_notify', None)
+    if notify is not None:
+        socks.append(notify.sl.s)
+    
+    for sock in socks:
+        for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+            try:
+                if sock.getsockopt(socket.SOL_SOCKET, option) < SOCKET_BUF_SIZE:
+                    sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUF_SIZE)
+            except OSError:
+                pass  # Keep the default size
+
+
+class EdgeCounter:
+    """
+    Lock-free event counter for pigpio callbacks. The callback thread calls
+    increment() (next() on an itertools.count: one atomic C-level step, no
+    lock, no Python int arithmetic); a single reader thread calls take() to
+    get the number of increments since its previous take().
+    """
+    
+    def __init__(self):
+        self._counter = itertools.count()
+        self.increment = self._counter.__next__
+        self._mark = self.increment()
+    
+    def take(self):
+        """Return the increments since the last take() (one reader thread only)"""
+        # Reading the counter advances it too; don't count the reader's own step
+        mark = self.increment()
+        count = mark - self._mark - 1
+        self._mark = mark
+        return count
+
+
+def reduce_timer_slack():
+    """Drop the calling thread's timer slack to 1 ns so step sleeps wake on time"""
+    try:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        libc.prctl(PR_SET_TIMERSLACK, 1, 0, 0, 0)
+    except (OSError, AttributeError):
+        pass  # Not Linux/glibc; keep the default 50 us slack
+
+
+def lock_process_memory():
+    """
+    Lock the process into RAM and keep the CPU out of deep idle states, so a
+    ramp step never waits on a page fault or a slow C-state exit.
+    Needs CAP_IPC_LOCK (or root); skipped with a warning otherwise.
+    """
+    global _cpu_dma_latency_fd
+    
+    try:
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            print(f"Warning: mlockall failed: {os.strerror(ctypes.get_errno())}")
+    except OSError:
+        pass
+    
+    if _cpu_dma_latency_fd is None:
+        try:
+            _cpu_dma_latency_fd = os.open("/dev/cpu_dma_latency", os.O_WRONLY)
+            os.write(_cpu_dma_latency_fd, struct.pack("i", 0))
+        except OSError as e:
+            print(f"Warning: could not set /dev/cpu_dma_latency: {e}")
+            _cpu_dma_latency_fd = None
+
+
+def set_realtime_priority():
+    """Move the calling thread to SCHED_FIFO (needs CAP_SYS_NICE or root)"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RT_PRIORITY))
+    except (PermissionError, AttributeError) as e:
+        print(f"Warning: ramp thread not real-time: {e}")
+
+
+class Motor:
+    def __init__(self, bank, pwm_pin, dir_pin, name):
+        self.bank = bank
+        self.pi = bank.pi
+        self.pwm_pin = pwm_pin
+        self.dir_pin = dir_pin
+        self.name = name
+        self.current_speed = 0
+        self.target_speed = 0
+        self.direction = 1  # 1=forward, -1=backward
+        
+        # Setup pins
+        self.pi.set_mode(self.pwm_pin, pigpio.OUTPUT)
+        self.pi.set_mode(self.dir_pin, pigpio.OUTPUT)
+        self.pi.write(self.dir_pin, 0)
+        
+        # Ramp state, advanced by the bank's scheduler thread. Every new ramp
+        # or stop takes a new generation, so a step computed for an older
+        # ramp is never written to the PWM.
+        self._gen = 0
+        self.ramping = False
+        self.ramp_speeds = ()
+        self.ramp_duties = ()
+        self.ramp_step = 0
+        
+        # Setup hardware PWM (stopped)
+        self.set_duty(0)
+    
+    def set_direction(self, direction):
+        """Set direction: 1=forward, -1=backward"""
+        self.bank.set_directions(((self, direction),))
+    
+    def set_duty(self, duty_percent):
+        """Set hardware PWM duty cycle in percent (0-100)"""
+        duty = int(duty_percent * PWM_RANGE / 100)
+        self.bank.update_duties(((self, duty, self._gen),))
+    
+    def ramp_to_speed(self, target_speed, direction):
+        """Ramp from current speed to target speed over RAMP_TIME (replaces any ramp in progress)"""
+        self.bank.ramp(((self, target_speed, direction),))
+    
+    def start_ramp(self, target_speed):
+        """Start a ramp to target_speed; the direction must already be set"""
+        self.target_speed = abs(target_speed)
+        
+        # Restart the ramp from wherever the motor is now
+        self._gen = next(_generations)
+        self.ramp_speeds, self.ramp_duties = ramp_profile(self.current_speed, self.target_speed)
+        self.ramp_step = 0
+        self.ramping = True
+        self.bank.wake()
+    
+    def next_duty(self):
+        """
+        Advance the ramp by one step.
+        Returns (pigpio duty, generation), or None if idle or the ramp was just replaced.
+        """
+        gen = self._gen
+        if not self.ramping:
+            return None
+        
+        step = self.ramp_step
+        new_speed = self.ramp_speeds[step]
+        duty = self.ramp_duties[step]
+        if self._gen != gen:
+            return None  # Replaced mid-step; the new ramp starts next tick
+        
+        self.current_speed = new_speed
+        if step == RAMP_STEPS:
+            self.ramping = False
+        else:
+            self.ramp_step = step + 1
+        return duty, gen
+    
+    def stop_smooth(self):
+        """Stop with ramping down to 0"""
+        self.ramp_to_speed(0, self.direction)
+    
+    def stop_immediate(self):
+        """Stop immediately without ramping"""
+        self._gen = next(_generations)
+        self.ramping = False
+        self.current_speed = 0
+        self.target_speed = 0
+        self.set_duty(0)
+    
+    def cleanup(self):
+        self.stop_immediate()
+        self.set_direction(-1)  # DIR pin low
+
+
+class MotorBank:
+    """
+    Group of motors ramped by a single scheduler thread.
+    
+    Each tick advances every ramping motor by one step and writes all the
+    new duty cycles in one batch, so the motors change speed together
+    instead of from one thread per motor.
+    """
+    def __init__(self, pi):
+        self.pi = pi
+        self.motors = []
+        self._dir_mask = 0  # Current level of every DIR pin, one bit per GPIO
+        
+        # Latest command from the UI, applied by the scheduler on its next tick
+        self._cmd_lock = threading.Lock()
+        self._pending_cmd = None
+        
+        self._wake_event = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def add_motor(self, pwm_pin, dir_pin, name):
+        """Create a motor driven by this bank"""
+        motor = Motor(self, pwm_pin, dir_pin, name)
+        self.motors.append(motor)
+        return motor
+    
+    def update_duties(self, duties):
+        """
+        Write (motor, pigpio duty, generation) entries to the PWM hardware in
+        one batch, skipping any whose motor has moved on to a newer generation
+        """
+        hardware_PWM = self.pi.hardware_PWM
+        with _pwm_lock:
+            for motor, duty, gen in duties:
+                if motor._gen == gen:
+                    hardware_PWM(motor.pwm_pin, PWM_FREQ, duty)
+    
+    def set_directions(self, directions):
+        """
+        Set the DIR pins of several motors from (motor, direction) pairs.
+        All pins change in at most two register writes (GPSET0/GPCLR0 through
+        pigpio's set_bank_1/clear_bank_1) however many motors are given.
+        """
+        with _pwm_lock:
+            new_mask = self._dir_mask
+            for motor, direction in directions:
+                motor.direction = direction
+                if direction == 1:
+                    new_mask |= 1 << motor.dir_pin
+                else:
+                    new_mask &= ~(1 << motor.dir_pin)
+            
+            set_mask = new_mask & ~self._dir_mask
+            clear_mask = self._dir_mask & ~new_mask
+            if set_mask:
+                self.pi.set_bank_1(set_mask)
+            if clear_mask:
+                self.pi.clear_bank_1(clear_mask)
+            self._dir_mask = new_mask
+    
+    def ramp(self, commands):
+        """Start (motor, speed, direction) ramps, setting all DIR pins first"""
+        self.set_directions([(motor, direction) for motor, speed, direction in commands])
+        for motor, speed, direction in commands:
+            motor.start_ramp(speed)
+    
+    def wake(self):
+        """Tell the scheduler thread that a ramp has started"""
+        self._wake_event.set()
+    
+    def submit(self, commands):
+        """
+        Queue (motor, speed, direction) ramps for the scheduler thread.
+        A direction of None keeps the motor's current direction. Replaces
+        any command the scheduler has not picked up yet; None just drops it.
+        """
+        with self._cmd_lock:
+            self._pending_cmd = commands
+        if commands:
+            self._wake_event.set()
+    
+    def emergency_stop(self):
+        """
+        Stop every motor without ramping. Runs on the scheduler thread, after
+        any command it has already picked up, so no ramp can restart the
+        motors afterwards; replaces any command not picked up yet.
+        """
+        self.submit(_STOP_ALL)
+    
+    def _apply_pending(self):
+        """Start the ramps of the latest submitted command, if any"""
+        if self._pending_cmd is None:
+            return  # Common case on every tick; skip the lock
+        with self._cmd_lock:
+            commands = self._pending_cmd
+            self._pending_cmd = None
+        if commands is _STOP_ALL:
+            for motor in self.motors:
+                motor.stop_immediate()
+        elif commands:
+            self.ramp(tuple(
+                (motor, speed, motor.direction if direction is None else direction)
+                for motor, speed, direction in commands
+            ))
+    
+    def _run(self):
+        """Scheduler thread: sleeps until a ramp starts, then ticks every STEP_DELAY"""
+        reduce_timer_slack()  # timer slack is per thread
+        set_realtime_priority()
+        
+        # Hot-loop names bound to locals once, instead of looked up every tick
+        motors = self.motors
+        apply_pending = self._apply_pending
+        update_duties = self.update_duties
+        monotonic = time.monotonic
+        sleep = time.sleep
+        
+        while self._running:
+            self._wake_event.wait()
+            self._wake_event.clear()
+            
+            # Step deadlines are absolute from the start of the ramp, so a
+            # late wakeup shortens the next sleep instead of adding drift
+            deadline = monotonic()
+            while self._running:
+                apply_pending()
+                
+                duties = []
+                for motor in motors:
+                    step = motor.next_duty()
+                    if step is not None:
+                        duties.append((motor, *step))
+                if not duties:
+                    break
+                
+                update_duties(duties)
+                deadline += STEP_DELAY
+                remaining = deadline - monotonic()
+                if remaining > 0:
+                    sleep(remaining)
+    
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._running = False
+        self._wake_event.set()
+        self._thread.join(timeout=1.0)
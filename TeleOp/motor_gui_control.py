@@ -18,12 +18,17 @@ Wiring:
   Left Motor: PWM=12, DIR=16
   Right Motor: PWM=18, DIR=23
   Z-Axis Motor: PWM=13, DIR=19
+
+GPIO 12 and 18 share PWM channel 0, so the left and right motors always run at
+the same duty cycle (turning is done with the DIR pins).
+
+Motor, ramping and pigpio setup live in motor_core.py (see there for the
+pigpiod and real-time requirements).
 """
-import RPi.GPIO as GPIO
 import tkinter as tk
 from tkinter import ttk
-import threading
-import time
+
+from motor_core import MotorBank, SPEED_LEVELS, LEVEL2_SPEED, RAMP_TIME, get_pi, lock_process_memory
 
 # --- Configuration ---
 # Left motor pins
@@ -38,96 +43,6 @@ RIGHT_DIR_PIN = 23
 Z_PWM_PIN = 13
 Z_DIR_PIN = 19
 
-PWM_FREQ = 1000  # 1 kHz
-
-# Speed levels (duty cycle %)
-SPEED_LEVELS = {
-    1: 20,
-    2: 40,
-    3: 60,
-    4: 80,
-    5: 100,
-}
-
-# Ramping parameters
-RAMP_TIME = 0.5  # 500ms for acceleration/deceleration
-RAMP_STEPS = 50  # Number of steps in ramp
-STEP_DELAY = RAMP_TIME / RAMP_STEPS  # Time per step
-
-
-class Motor:
-    def __init__(self, pwm_pin, dir_pin, name):
-        self.pwm_pin = pwm_pin
-        self.dir_pin = dir_pin
-        self.name = name
-        self.current_speed = 0
-        self.target_speed = 0
-        self.direction = 1  # 1=forward, -1=backward
-        
-        # Setup pins
-        GPIO.setup(self.pwm_pin, GPIO.OUT)
-        GPIO.setup(self.dir_pin, GPIO.OUT)
-        GPIO.output(self.pwm_pin, GPIO.LOW)
-        GPIO.output(self.dir_pin, GPIO.LOW)
-        
-        # Setup PWM
-        self.pwm = GPIO.PWM(self.pwm_pin, PWM_FREQ)
-        self.pwm.start(0)
-        
-        self.ramping = False
-        self.ramp_thread = None
-        self.stop_requested = False
-    
-    def set_direction(self, direction):
-        """Set direction: 1=forward, -1=backward"""
-        self.direction = direction
-        GPIO.output(self.dir_pin, GPIO.HIGH if direction == 1 else GPIO.LOW)
-    
-    def ramp_to_speed(self, target_speed, direction):
-        """Ramp from current speed to target speed over RAMP_TIME"""
-        # Stop any ongoing ramp
-        self.stop_requested = True
-        if self.ramp_thread and self.ramp_thread.is_alive():
-            self.ramp_thread.join(timeout=0.1)
-        
-        self.stop_requested = False
-        self.target_speed = abs(target_speed)
-        self.set_direction(direction)
-        
-        def ramp():
-            start_speed = self.current_speed
-            speed_diff = self.target_speed - start_speed
-            
-            for step in range(RAMP_STEPS + 1):
-                if self.stop_requested:
-                    break
-                fraction = step / RAMP_STEPS
-                new_speed = start_speed + (speed_diff * fraction)
-                self.current_speed = new_speed
-                self.pwm.ChangeDutyCycle(new_speed)
-                time.sleep(STEP_DELAY)
-            
-            if not self.stop_requested:
-                self.current_speed = self.target_speed
-        
-        self.ramp_thread = threading.Thread(target=ramp, daemon=True)
-        self.ramp_thread.start()
-    
-    def stop_smooth(self):
-        """Stop with ramping down to 0"""
-        self.ramp_to_speed(0, self.direction)
-    
-    def stop_immediate(self):
-        """Stop immediately without ramping"""
-        self.stop_requested = True
-        self.current_speed = 0
-        self.target_speed = 0
-        self.pwm.ChangeDutyCycle(0)
-    
-    def cleanup(self):
-        self.stop_immediate()
-        self.pwm.stop()
-
 
 class MotorControlGUI:
     def __init__(self, root):
@@ -136,16 +51,18 @@ class MotorControlGUI:
         self.root.geometry("500x700")
         self.root.configure(bg='#2b2b2b')
         
-        # Initialize GPIO
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+        self.pi = get_pi()
         
-        self.left_motor = Motor(LEFT_PWM_PIN, LEFT_DIR_PIN, "Left")
-        self.right_motor = Motor(RIGHT_PWM_PIN, RIGHT_DIR_PIN, "Right")
-        self.z_motor = Motor(Z_PWM_PIN, Z_DIR_PIN, "Z-Axis")
+        lock_process_memory()
+        self.bank = MotorBank(self.pi)
+        self.left_motor = self.bank.add_motor(LEFT_PWM_PIN, LEFT_DIR_PIN, "Left")
+        self.right_motor = self.bank.add_motor(RIGHT_PWM_PIN, RIGHT_DIR_PIN, "Right")
+        self.z_motor = self.bank.add_motor(Z_PWM_PIN, Z_DIR_PIN, "Z-Axis")
         
         self.current_level = 3
+        self._current_speed = SPEED_LEVELS[self.current_level]
         self.active_direction = None
+        self._status_after_id = None  # pending "STOPPED" label update
         
         self.create_widgets()
         
@@ -345,67 +262,71 @@ class MotorControlGUI:
     def on_speed_change(self, value):
         """Handle speed slider change"""
         self.current_level = int(value)
+        self._current_speed = SPEED_LEVELS[self.current_level]
         self.speed_display.config(
-            text=f"Level {self.current_level} ({SPEED_LEVELS[self.current_level]}%)"
+            text=f"Level {self.current_level} ({self._current_speed}%)"
         )
     
     def on_button_press(self, direction):
-        """Handle arrow button press"""
+        """Handle arrow button press (the ramp itself starts on the scheduler thread)"""
         self.active_direction = direction
+        self._cancel_status_update()
         
         if direction == 'forward':
-            speed = SPEED_LEVELS[self.current_level]
-            self.left_motor.ramp_to_speed(speed, 1)
-            self.right_motor.ramp_to_speed(speed, 1)
+            speed = self._current_speed
+            self.bank.submit(((self.left_motor, speed, 1), (self.right_motor, speed, 1)))
             self.status_label.config(text=f"Status: FORWARD (Level {self.current_level})", fg='#4CAF50')
         
         elif direction == 'backward':
-            speed = SPEED_LEVELS[self.current_level]
-            self.left_motor.ramp_to_speed(speed, -1)
-            self.right_motor.ramp_to_speed(speed, -1)
+            speed = self._current_speed
+            self.bank.submit(((self.left_motor, speed, -1), (self.right_motor, speed, -1)))
             self.status_label.config(text=f"Status: BACKWARD (Level {self.current_level})", fg='#4CAF50')
         
         elif direction == 'left':
-            speed = SPEED_LEVELS[2]
-            self.left_motor.ramp_to_speed(speed, -1)
-            self.right_motor.ramp_to_speed(speed, 1)
+            speed = LEVEL2_SPEED
+            self.bank.submit(((self.left_motor, speed, -1), (self.right_motor, speed, 1)))
             self.status_label.config(text="Status: TURN LEFT", fg='#2196F3')
         
         elif direction == 'right':
-            speed = SPEED_LEVELS[2]
-            self.left_motor.ramp_to_speed(speed, 1)
-            self.right_motor.ramp_to_speed(speed, -1)
+            speed = LEVEL2_SPEED
+            self.bank.submit(((self.left_motor, speed, 1), (self.right_motor, speed, -1)))
             self.status_label.config(text="Status: TURN RIGHT", fg='#2196F3')
         
         elif direction == 'z_up':
-            speed = SPEED_LEVELS[2]
-            self.z_motor.ramp_to_speed(speed, 1)
+            speed = LEVEL2_SPEED
+            self.bank.submit(((self.z_motor, speed, 1),))
             self.status_label.config(text="Status: Z-AXIS UP", fg='#FF9800')
         
         elif direction == 'z_down':
-            speed = SPEED_LEVELS[2]
-            self.z_motor.ramp_to_speed(speed, -1)
+            speed = LEVEL2_SPEED
+            self.bank.submit(((self.z_motor, speed, -1),))
             self.status_label.config(text="Status: Z-AXIS DOWN", fg='#FF9800')
     
     def on_button_release(self):
         """Handle arrow button release"""
         self.active_direction = None
-        self.left_motor.stop_smooth()
-        self.right_motor.stop_smooth()
-        self.z_motor.stop_smooth()
+        self.bank.submit(tuple((motor, 0, None) for motor in self.bank.motors))
         self.status_label.config(text="Status: STOPPING", fg='#FF9800')
         
-        # Update to STOPPED after ramp time
-        self.root.after(int(RAMP_TIME * 1000), lambda: self.status_label.config(
-            text="Status: STOPPED", fg='#FF9800'
-        ))
+        # Update to STOPPED after ramp time (replacing any earlier pending update)
+        self._cancel_status_update()
+        self._status_after_id = self.root.after(int(RAMP_TIME * 1000), self._set_stopped_status)
+    
+    def _set_stopped_status(self):
+        self._status_after_id = None
+        self.status_label.config(text="Status: STOPPED", fg='#FF9800')
+    
+    def _cancel_status_update(self):
+        """Cancel a pending STOPPED label update so it can't overwrite newer status"""
+        if self._status_after_id is not None:
+            self.root.after_cancel(self._status_after_id)
+            self._status_after_id = None
     
     def emergency_stop(self):
         """Immediate stop without ramping"""
         self.active_direction = None
-        self.left_motor.stop_immediate()
-        self.right_motor.stop_immediate()
-        self.z_motor.stop_immediate()
+        self.bank.emergency_stop()
+        self._cancel_status_update()
         self.status_label.config(text="Status: EMERGENCY STOP", fg='#f44336')
     
     def on_closing(self):
@@ -414,7 +335,7 @@ class MotorControlGUI:
         self.left_motor.cleanup()
         self.right_motor.cleanup()
         self.z_motor.cleanup()
-        GPIO.cleanup()
+        self.bank.stop()
         self.root.destroy()
     
     def run(self):
@@ -429,4 +350,3 @@ if __name__ == '__main__':
         app.run()
     except Exception as e:
         print(f"Error: {e}")
-        GPIO.cleanup()
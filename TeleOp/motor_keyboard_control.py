@@ -19,12 +19,22 @@ Features:
 
 Wiring:
   Left Motor: PWM=12, DIR=16
-  Right Motor: PWM=13, DIR=20
+  Right Motor: PWM=18, DIR=23
+
+GPIO 12 and 18 share PWM channel 0, so both motors always run at the same duty
+cycle (turning is done with the DIR pins).
+
+Keys are read directly from the kernel input device with evdev, so no X
+display or window focus is needed. The user must be able to read
+/dev/input/event* (sudo usermod -a -G input $USER).
+
+Motor, ramping and pigpio setup live in motor_core.py (see there for the
+pigpiod and real-time requirements).
 """
-import RPi.GPIO as GPIO
-from pynput import keyboard
-import threading
-import time
+from evdev import InputDevice, ecodes, list_devices
+import functools
+
+from motor_core import MotorBank, SPEED_LEVELS, LEVEL2_SPEED, get_pi, lock_process_memory
 
 # --- Configuration ---
 # Left motor pins
@@ -35,196 +45,140 @@ LEFT_DIR_PIN = 16
 RIGHT_PWM_PIN = 18
 RIGHT_DIR_PIN = 23
 
-PWM_FREQ = 1000  # 1 kHz
+# Keyboard input device, e.g. '/dev/input/by-id/usb-<name>-event-kbd'.
+# None = use the first device that has a W key.
+KEYBOARD_DEVICE = None
 
-# Speed levels (duty cycle %)
-SPEED_LEVELS = {
-    1: 20,
-    2: 40,
-    3: 60,
-    4: 80,
-    5: 100,
+# evdev key codes handled by the controller -> key character
+KEY_CHARS = {
+    ecodes.KEY_W: 'w',
+    ecodes.KEY_S: 's',
+    ecodes.KEY_A: 'a',
+    ecodes.KEY_D: 'd',
+    ecodes.KEY_1: '1',
+    ecodes.KEY_2: '2',
+    ecodes.KEY_3: '3',
+    ecodes.KEY_4: '4',
+    ecodes.KEY_5: '5',
+    ecodes.KEY_Q: 'q',
 }
 
-# Ramping parameters
-RAMP_TIME = 0.5  # 500ms for acceleration/deceleration
-RAMP_STEPS = 50  # Number of steps in ramp
-STEP_DELAY = RAMP_TIME / RAMP_STEPS  # Time per step
+# EV_KEY event values
+KEY_UP = 0
+KEY_DOWN = 1
 
+# Keys that drive the motors; releasing the last one stops them
+MOVEMENT_KEYS = frozenset('wsad')
 
-class Motor:
-    def __init__(self, pwm_pin, dir_pin, name):
-        self.pwm_pin = pwm_pin
-        self.dir_pin = dir_pin
-        self.name = name
-        self.current_speed = 0
-        self.target_speed = 0
-        self.direction = 1  # 1=forward, -1=backward
-        
-        # Setup pins
-        GPIO.setup(self.pwm_pin, GPIO.OUT)
-        GPIO.setup(self.dir_pin, GPIO.OUT)
-        GPIO.output(self.pwm_pin, GPIO.LOW)
-        GPIO.output(self.dir_pin, GPIO.LOW)
-        
-        # Setup PWM
-        self.pwm = GPIO.PWM(self.pwm_pin, PWM_FREQ)
-        self.pwm.start(0)
-        
-        self.ramping = False
-        self.ramp_thread = None
-    
-    def set_direction(self, direction):
-        """Set direction: 1=forward, -1=backward"""
-        self.direction = direction
-        GPIO.output(self.dir_pin, GPIO.HIGH if direction == 1 else GPIO.LOW)
-    
-    def ramp_to_speed(self, target_speed, direction):
-        """Ramp from current speed to target speed over RAMP_TIME"""
-        if self.ramping:
-            return  # Already ramping
-        
-        self.ramping = True
-        self.target_speed = abs(target_speed)
-        self.set_direction(direction)
-        
-        def ramp():
-            start_speed = self.current_speed
-            speed_diff = self.target_speed - start_speed
-            
-            for step in range(RAMP_STEPS + 1):
-                if not self.ramping:
-                    break
-                fraction = step / RAMP_STEPS
-                new_speed = start_speed + (speed_diff * fraction)
-                self.current_speed = new_speed
-                self.pwm.ChangeDutyCycle(new_speed)
-                time.sleep(STEP_DELAY)
-            
-            self.current_speed = self.target_speed
-            self.ramping = False
-        
-        self.ramp_thread = threading.Thread(target=ramp, daemon=True)
-        self.ramp_thread.start()
-    
-    def stop_smooth(self):
-        """Stop with ramping down to 0"""
-        self.ramp_to_speed(0, self.direction)
-    
-    def stop_immediate(self):
-        """Stop immediately without ramping"""
-        self.ramping = False
-        self.current_speed = 0
-        self.target_speed = 0
-        self.pwm.ChangeDutyCycle(0)
-    
-    def cleanup(self):
-        self.stop_immediate()
-        self.pwm.stop()
+
+def find_keyboard():
+    """Return the first input device that has a W key"""
+    for path in list_devices():
+        device = InputDevice(path)
+        if ecodes.KEY_W in device.capabilities().get(ecodes.EV_KEY, []):
+            return device
+        device.close()
+    raise RuntimeError("No keyboard found in /dev/input (is the user in the 'input' group?)")
 
 
 class DualMotorController:
     def __init__(self):
-        GPIO.setmode(GPIO.BCM)
+        self.pi = get_pi()
         
-        self.left_motor = Motor(LEFT_PWM_PIN, LEFT_DIR_PIN, "Left")
-        self.right_motor = Motor(RIGHT_PWM_PIN, RIGHT_DIR_PIN, "Right")
+        lock_process_memory()
+        self.bank = MotorBank(self.pi)
+        self.left_motor = self.bank.add_motor(LEFT_PWM_PIN, LEFT_DIR_PIN, "Left")
+        self.right_motor = self.bank.add_motor(RIGHT_PWM_PIN, RIGHT_DIR_PIN, "Right")
         
         self.current_level = 3  # Default level
+        self._current_speed = SPEED_LEVELS[self.current_level]
         self.active_keys = set()
         self.running = True
+        
+        # Key -> handler dispatch table for on_press
+        self.key_actions = {
+            'w': self.forward,
+            's': self.backward,
+            'a': self.turn_left,
+            'd': self.turn_right,
+            'q': self.quit,
+        }
+        for level in SPEED_LEVELS:
+            self.key_actions[str(level)] = functools.partial(self.set_speed_level, level)
     
     def set_speed_level(self, level):
         """Set the current speed level (1-5)"""
         if level in SPEED_LEVELS:
             self.current_level = level
+            self._current_speed = SPEED_LEVELS[level]
             print(f"Speed level set to: {level} ({SPEED_LEVELS[level]}%)")
     
     def forward(self):
         """Both motors forward"""
-        speed = SPEED_LEVELS[self.current_level]
+        speed = self._current_speed
         print(f"FORWARD at level {self.current_level}")
-        self.left_motor.ramp_to_speed(speed, 1)
-        self.right_motor.ramp_to_speed(speed, 1)
+        self.bank.submit(((self.left_motor, speed, 1), (self.right_motor, speed, 1)))
     
     def backward(self):
         """Both motors backward"""
-        speed = SPEED_LEVELS[self.current_level]
+        speed = self._current_speed
         print(f"BACKWARD at level {self.current_level}")
-        self.left_motor.ramp_to_speed(speed, -1)
-        self.right_motor.ramp_to_speed(speed, -1)
+        self.bank.submit(((self.left_motor, speed, -1), (self.right_motor, speed, -1)))
     
     def turn_left(self):
         """Turn left: left backward, right forward at level 2"""
-        speed = SPEED_LEVELS[2]
+        speed = LEVEL2_SPEED
         print("TURN LEFT")
-        self.left_motor.ramp_to_speed(speed, -1)
-        self.right_motor.ramp_to_speed(speed, 1)
+        self.bank.submit(((self.left_motor, speed, -1), (self.right_motor, speed, 1)))
     
     def turn_right(self):
         """Turn right: left forward, right backward at level 2"""
-        speed = SPEED_LEVELS[2]
+        speed = LEVEL2_SPEED
         print("TURN RIGHT")
-        self.left_motor.ramp_to_speed(speed, 1)
-        self.right_motor.ramp_to_speed(speed, -1)
+        self.bank.submit(((self.left_motor, speed, 1), (self.right_motor, speed, -1)))
     
     def stop_all(self):
         """Stop both motors with smooth ramping"""
         print("STOPPING")
-        self.left_motor.stop_smooth()
-        self.right_motor.stop_smooth()
+        self.bank.submit(((self.left_motor, 0, None), (self.right_motor, 0, None)))
     
-    def on_press(self, key):
-        """Handle key press events"""
-        try:
-            if hasattr(key, 'char') and key.char:
-                k = key.char.lower()
-                
-                # Avoid repeated presses
-                if k in self.active_keys:
-                    return
-                
-                self.active_keys.add(k)
-                
-                if k == 'w':
-                    self.forward()
-                elif k == 's':
-                    self.backward()
-                elif k == 'a':
-                    self.turn_left()
-                elif k == 'd':
-                    self.turn_right()
-                elif k in ('1', '2', '3', '4', '5'):
-                    self.set_speed_level(int(k))
-                elif k == 'q':
-                    print("Quitting...")
-                    self.running = False
-                    return False  # Stop listener
-        except AttributeError:
-            pass
+    def quit(self):
+        """Stop the keyboard listener"""
+        print("Quitting...")
+        self.running = False
+        return False  # Stop listener
     
-    def on_release(self, key):
-        """Handle key release events"""
-        try:
-            if hasattr(key, 'char') and key.char:
-                k = key.char.lower()
-                
-                if k in self.active_keys:
-                    self.active_keys.remove(k)
-                
-                # Stop motors when W, S, A, or D are released
-                if k in ('w', 's', 'a', 'd'):
-                    # Only stop if no other movement keys are pressed
-                    if not any(mk in self.active_keys for mk in ('w', 's', 'a', 'd')):
-                        self.stop_all()
-        except AttributeError:
-            pass
+    def on_press(self, k):
+        """Handle key press events (k is the lowercase key character)"""
+        # Avoid repeated presses
+        if k in self.active_keys:
+            return
+        
+        self.active_keys.add(k)
+        
+        action = self.key_actions.get(k)
+        if action is not None:
+            return action()
+    
+    def on_release(self, k):
+        """Handle key release events (k is the lowercase key character)"""
+        if k in self.active_keys:
+            self.active_keys.remove(k)
+        
+        # Stop motors when W, S, A, or D are released
+        if k in MOVEMENT_KEYS:
+            # Only stop if no other movement keys are pressed
+            if self.active_keys.isdisjoint(MOVEMENT_KEYS):
+                self.stop_all()
     
     def run(self):
         """Main loop"""
+        keyboard = InputDevice(KEYBOARD_DEVICE) if KEYBOARD_DEVICE else find_keyboard()
+        
         print("\n" + "="*50)
         print("Dual Motor Keyboard Controller")
         print("="*50)
+        print(f"Keyboard: {keyboard.name} ({keyboard.path})")
         print("Controls:")
         print("  W - Forward")
         print("  S - Backward")
@@ -235,25 +189,42 @@ class DualMotorController:
         print(f"\nCurrent speed level: {self.current_level}")
         print("="*50 + "\n")
         
-        # Start keyboard listener
-        with keyboard.Listener(on_press=self.on_press, on_release=self.on_release) as listener:
-            listener.join()
-        
-        # Cleanup
+        # Read key events straight from the kernel input device
+        try:
+            for event in keyboard.read_loop():
+                if event.type != ecodes.EV_KEY:
+                    continue
+                k = KEY_CHARS.get(event.code)
+                if k is None:
+                    continue
+                
+                if event.value == KEY_DOWN:
+                    if self.on_press(k) is False:
+                        break
+                elif event.value == KEY_UP:
+                    self.on_release(k)
+                # KEY_HOLD (auto-repeat) is ignored, like repeated presses
+        finally:
+            keyboard.close()
+    
+    def cleanup(self):
+        """Stop both motors and the ramp scheduler"""
         print("\nCleaning up...")
         self.left_motor.cleanup()
         self.right_motor.cleanup()
-        GPIO.cleanup()
+        self.bank.stop()
         print("Done!")
 
 
 if __name__ == '__main__':
+    controller = None
     try:
         controller = DualMotorController()
         controller.run()
     except KeyboardInterrupt:
         print("\nInterrupted!")
-        GPIO.cleanup()
     except Exception as e:
         print(f"Error: {e}")
-        GPIO.cleanup()
+    finally:
+        if controller is not None:
+            controller.cleanup()
@@ -25,7 +25,10 @@ Controls (interactive):
 
 """
 import RPi.GPIO as GPIO
-from time import sleep
+import cmd
+import selectors
+import signal
+import sys
 
 # --- Configuration ---
 PWM_PIN = 18    # PWM pin for speed control
@@ -41,6 +44,10 @@ SPEED_LEVELS = {
     5: 100,
 }
 
+# Messages printed on level changes, formatted once
+_SPEED_MSGS = {level: f"Speed set to: Level {level} ({duty}%)" for level, duty in SPEED_LEVELS.items()}
+_RUN_SPEED_MSGS = {level: f"Speed: Level {level} ({duty}%)" for level, duty in SPEED_LEVELS.items()}
+
 # Setup GPIO
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(PWM_PIN, GPIO.OUT)
@@ -52,9 +59,112 @@ GPIO.output(DIR_PIN, GPIO.LOW)
 pwm = GPIO.PWM(PWM_PIN, PWM_FREQ)
 pwm.start(0)  # Start with 0% duty cycle (stopped)
 
-# State variables
-current_speed_level = 1
-is_forward = True  # True = forward, False = backward
+running = True
+
+
+class MotorShell(cmd.Cmd):
+    """Single-letter motor commands; each do_* method handles one command"""
+    prompt = "Enter command: "
+    
+    def __init__(self):
+        super().__init__()
+        self.current_speed_level = 1
+        self.is_forward = True  # True = forward, False = backward
+    
+    def print_status(self):
+        """Print the motor state; called only after a command changes it"""
+        direction = "FORWARD" if self.is_forward else "BACKWARD"
+        print(f"Current: {direction}, Level {self.current_speed_level} "
+              f"({SPEED_LEVELS[self.current_speed_level]}%)")
+    
+    def set_level(self, level):
+        self.current_speed_level = level
+        pwm.ChangeDutyCycle(SPEED_LEVELS[level])
+        print(_SPEED_MSGS[level])
+    
+    def do_r(self, arg):
+        print("RUN")
+        if self.is_forward:
+            GPIO.output(DIR_PIN, GPIO.HIGH)
+            print("Direction: FORWARD")
+        else:
+            GPIO.output(DIR_PIN, GPIO.LOW)
+            print("Direction: BACKWARD")
+        pwm.ChangeDutyCycle(SPEED_LEVELS[self.current_speed_level])
+        print(_RUN_SPEED_MSGS[self.current_speed_level])
+    
+    def do_s(self, arg):
+        print("STOP")
+        pwm.ChangeDutyCycle(0)
+        GPIO.output(DIR_PIN, GPIO.LOW)
+    
+    def do_f(self, arg):
+        print("Direction set to: FORWARD")
+        self.is_forward = True
+        GPIO.output(DIR_PIN, GPIO.HIGH)
+        self.print_status()
+    
+    def do_b(self, arg):
+        print("Direction set to: BACKWARD")
+        self.is_forward = False
+        GPIO.output(DIR_PIN, GPIO.LOW)
+        self.print_status()
+    
+    def do_1(self, arg):
+        self.set_level(1)
+    
+    def do_2(self, arg):
+        self.set_level(2)
+    
+    def do_3(self, arg):
+        self.set_level(3)
+    
+    def do_4(self, arg):
+        self.set_level(4)
+    
+    def do_5(self, arg):
+        self.set_level(5)
+    
+    def do_e(self, arg):
+        print("Exiting...")
+        return True
+    
+    def do_EOF(self, arg):
+        print("\nExiting...")
+        return True
+    
+    def default(self, line):
+        print("<<< Invalid command >>>")
+        print("Use: r/s/f/b/1/2/3/4/5/e")
+    
+    def emptyline(self):
+        # cmd.Cmd repeats the last command on an empty line; treat it as invalid
+        self.default("")
+
+
+def request_exit(signum, frame):
+    """SIGHUP/SIGTERM: leave the command loop and clean up"""
+    global running
+    running = False
+
+
+def cleanup():
+    pwm.ChangeDutyCycle(0)
+    GPIO.output(DIR_PIN, GPIO.LOW)
+    pwm.stop()
+    GPIO.cleanup()
+    print("GPIO Cleanup complete")
+
+
+signal.signal(signal.SIGHUP, request_exit)
+signal.signal(signal.SIGTERM, request_exit)
+
+# Block in select() on stdin instead of input(), so the loop sleeps in the
+# kernel and wakes up for signals as well as for commands. Lines are handed
+# to MotorShell.onecmd() for dispatch.
+selector = selectors.DefaultSelector()
+selector.register(sys.stdin, selectors.EVENT_READ)
+shell = MotorShell()
 
 print("\n")
 print("Motor Controller Started")
@@ -63,58 +173,20 @@ print("Commands: r-run s-stop f-forward b-backward 1/2/3/4/5-speed levels e-exit
 print("\n")
 
 try:
-    while True:
-        cmd = input("Enter command: ").strip().lower()
-        
-        if cmd == 'r':
-            print("RUN")
-            if is_forward:
-                GPIO.output(DIR_PIN, GPIO.HIGH)
-                print("Direction: FORWARD")
-            else:
-                GPIO.output(DIR_PIN, GPIO.LOW)
-                print("Direction: BACKWARD")
-            pwm.ChangeDutyCycle(SPEED_LEVELS[current_speed_level])
-            print(f"Speed: Level {current_speed_level} ({SPEED_LEVELS[current_speed_level]}%)")
-        
-        elif cmd == 's':
-            print("STOP")
-            pwm.ChangeDutyCycle(0)
-            GPIO.output(DIR_PIN, GPIO.LOW)
-        
-        elif cmd == 'f':
-            print("Direction set to: FORWARD")
-            is_forward = True
-            GPIO.output(DIR_PIN, GPIO.HIGH)
-        
-        elif cmd == 'b':
-            print("Direction set to: BACKWARD")
-            is_forward = False
-            GPIO.output(DIR_PIN, GPIO.LOW)
-        
-        elif cmd in ('1', '2', '3', '4', '5'):
-            level = int(cmd)
-            current_speed_level = level
-            pwm.ChangeDutyCycle(SPEED_LEVELS[level])
-            print(f"Speed set to: Level {level} ({SPEED_LEVELS[level]}%)")
+    print(shell.prompt, end="", flush=True)
+    while running:
+        if not selector.select(timeout=1.0):
+            continue
         
-        elif cmd == 'e':
-            print("Exiting...")
-            pwm.ChangeDutyCycle(0)
-            GPIO.output(DIR_PIN, GPIO.LOW)
-            pwm.stop()
-            GPIO.cleanup()
-            print("GPIO Cleanup complete")
+        line = sys.stdin.readline()
+        if shell.onecmd(line.strip().lower() if line else "EOF"):
             break
         
-        else:
-            print("<<< Invalid command >>>")
-            print("Use: r/s/f/b/1/2/3/4/5/e")
+        print(shell.prompt, end="", flush=True)
 
 except KeyboardInterrupt:
     print("\nInterrupted! Cleaning up...")
-    pwm.ChangeDutyCycle(0)
-    GPIO.output(DIR_PIN, GPIO.LOW)
-    pwm.stop()
-    GPIO.cleanup()
-    print("GPIO Cleanup complete")
+
+finally:
+    selector.close()
+    cleanup()
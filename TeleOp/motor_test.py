@@ -5,61 +5,104 @@ motor_test.py
 Motor test script: cycles through speed levels 1-5 in forward direction,
 then level 1 in reverse.
 
-Requires pigpiod running: sudo systemctl enable --now pigpiod
+PWM comes from the kernel PWM driver (/sys/class/pwm) and the DIR pin is
+driven through libgpiod, so pigpiod is not needed. GPIO 18 is PWM0 channel 0;
+enable it once in /boot/firmware/config.txt and reboot:
+  dtoverlay=pwm,pin=18,func=2
+
+The sequence runs as an asyncio coroutine so the waits between levels don't
+block the interpreter.
 """
-import pigpio
-import time
+import asyncio
+import os
+
+import gpiod
+from gpiod.line import Direction, Value
 
 # Pin configuration
 PWM_PIN = 18
 DIR_PIN = 23
 PWM_FREQ = 20000
 
-# Speed levels (20%, 40%, 60%, 80%, 100%)
-SPEED_LEVELS = {
-    1: int(0.20 * 1_000_000),
-    2: int(0.40 * 1_000_000),
-    3: int(0.60 * 1_000_000),
-    4: int(0.80 * 1_000_000),
-    5: int(1.00 * 1_000_000),
-}
+# Kernel PWM channel behind PWM_PIN, and the GPIO chip that has DIR_PIN
+PWM_CHIP = 0
+PWM_CHANNEL = 0
+GPIO_CHIP = '/dev/gpiochip0'
+
+# Speed levels 1-5 (20%, 40%, 60%, 80%, 100%); level n is SPEED_LEVELS[n - 1]
+SPEED_LEVELS = tuple(int(f * 1_000_000) for f in (0.20, 0.40, 0.60, 0.80, 1.00))
+
+
+class KernelPWM:
+    """One channel of the kernel PWM driver, with the duty_cycle file kept open"""
+    
+    def __init__(self, chip, channel, freq):
+        base = f"/sys/class/pwm/pwmchip{chip}"
+        self.path = f"{base}/pwm{channel}"
+        if not os.path.isdir(self.path):
+            self._write(f"{base}/export", channel)
+        
+        self.period_ns = 1_000_000_000 // freq
+        self._write(f"{self.path}/duty_cycle", 0)  # duty must never exceed period
+        self._write(f"{self.path}/period", self.period_ns)
+        self._write(f"{self.path}/enable", 1)
+        self._duty_fd = os.open(f"{self.path}/duty_cycle", os.O_WRONLY)
+    
+    @staticmethod
+    def _write(path, value):
+        with open(path, 'w') as f:
+            f.write(str(value))
+    
+    def set_duty(self, duty):
+        """Set the duty cycle, 0..1,000,000 like pigpio's hardware_PWM"""
+        os.pwrite(self._duty_fd, b'%d' % (self.period_ns * duty // 1_000_000), 0)
+    
+    def close(self):
+        self.set_duty(0)
+        os.close(self._duty_fd)
+        self._write(f"{self.path}/enable", 0)
+
 
-def main():
-    pi = pigpio.pi()
-    if not pi.connected:
-        print("Error: pigpiod not running. Start with: sudo systemctl enable --now pigpiod")
+async def main():
+    try:
+        pwm = KernelPWM(PWM_CHIP, PWM_CHANNEL, PWM_FREQ)
+    except OSError as e:
+        print(f"Error: kernel PWM not available ({e}). Add dtoverlay=pwm,pin=18,func=2 to config.txt")
         return
     
-    # Setup pins
-    pi.set_mode(PWM_PIN, pigpio.OUTPUT)
-    pi.set_mode(DIR_PIN, pigpio.OUTPUT)
+    # Setup DIR pin
+    dir_line = gpiod.request_lines(
+        GPIO_CHIP,
+        consumer="motor_test",
+        config={DIR_PIN: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE)},
+    )
     
     try:
         # Forward direction: cycle through levels 1-5
-        pi.write(DIR_PIN, 1)  # Forward direction
+        dir_line.set_value(DIR_PIN, Value.ACTIVE)  # Forward direction
         
-        for level in range(1, 6):
+        set_duty = pwm.set_duty
+        for level, duty in enumerate(SPEED_LEVELS, 1):
             print(f"Running FORWARD at level {level} speed for 5 seconds...")
-            pi.hardware_PWM(PWM_PIN, PWM_FREQ, SPEED_LEVELS[level])
-            time.sleep(5)
+            set_duty(duty)
+            await asyncio.sleep(5)
         
         # Reverse direction: level 1
         print("Running REVERSE at level 1 speed for 5 seconds...")
-        pi.write(DIR_PIN, 0)  # Reverse direction
-        pi.hardware_PWM(PWM_PIN, PWM_FREQ, SPEED_LEVELS[1])
-        time.sleep(5)
+        dir_line.set_value(DIR_PIN, Value.INACTIVE)  # Reverse direction
+        set_duty(SPEED_LEVELS[0])
+        await asyncio.sleep(5)
         
         # Stop
         print("Stopping motor...")
-        pi.hardware_PWM(PWM_PIN, PWM_FREQ, 0)
-        pi.write(DIR_PIN, 0)
+        set_duty(0)
         
     finally:
         # Cleanup
-        pi.hardware_PWM(PWM_PIN, PWM_FREQ, 0)
-        pi.write(DIR_PIN, 0)
-        pi.stop()
+        pwm.close()
+        dir_line.set_value(DIR_PIN, Value.INACTIVE)
+        dir_line.release()
         print("Done!")
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
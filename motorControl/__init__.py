@@ -2,7 +2,7 @@
 Motor Control Module for Arduino Communication
 """
 
-from .controller import MotorController
+from .controller import MotorController, close_all
 
-__all__ = ['MotorController']
+__all__ = ['MotorController', 'close_all']
 __version__ = '1.0.0'
@@ -4,11 +4,100 @@ Motor Controller Class
 Provides interface to control motors and get distance measurements via Arduino
 """
 
+import atexit
+import numpy as np
+import re
 import serial
+import struct
+import threading
 import time
 
+# Open serial connections, reused by later MotorController instances so they
+# skip the open + 2 s Arduino reset wait. A connection is only handed to one
+# controller at a time: the one whose reader thread is using it.
+_pool_lock = threading.Lock()
+_pool = {}  # (port, baudrate) -> serial.Serial
+_in_use = set()  # Keys of the connections a MotorController holds
+
+# Distances in a telemetry line, matched on the raw bytes
+_DIST_PATTERN = re.compile(rb"Dist1\(cm\):(-?[\d.]+),Dist2\(cm\):(-?[\d.]+)")
+
+# Longest wait for the Arduino's ACK after an RPM command (seconds)
+_ACK_TIMEOUT = 0.2
+
+# Binary telemetry frames (BINARY_TELEMETRY in PID_with_odometry.ino): sync
+# byte, distance 1 and 2 in mm, xor of the 4 distance bytes
+_FRAME_SYNC = 0xAA
+_FRAME = struct.Struct('<BhhB')
+
+# Line the Arduino sends after applying each RPM command, in both formats
+_ACK_LINE = b"ACK\r\n"
+
+def close_all():
+    """Close every pooled serial connection (registered with atexit)"""
+    with _pool_lock:
+        connections = list(_pool.values())
+        _pool.clear()
+    for ser in connections:
+        if ser.is_open:
+            ser.close()
+            print("Arduino connection closed")
+
+atexit.register(close_all)
+
+def _sleep_until(deadline):
+    """Sleep until the given time.monotonic() deadline (no-op if it has passed)"""
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
+def _parse_dist(raw):
+    """Parse a 'Dist1(cm):x,Dist2(cm):y' line -> (d1, d2), or None if it isn't one"""
+    m = _DIST_PATTERN.search(raw)
+    if m is None:
+        return None
+    try:
+        return float(m.group(1)), float(m.group(2))
+    except ValueError:
+        return None  # Line cut off mid-number, e.g. "1.2." after a port flush
+
+def parse_frames(buf):
+    """
+    Remove the complete binary frames and ACK lines from buf (a bytearray),
+    skipping bytes that are part of neither
+    Returns: (last (d1, d2) in cm or None, number of ACK lines)
+    """
+    dist = None
+    acks = 0
+    size = _FRAME.size
+    n = len(buf)
+    i = 0
+    while i < n:
+        if buf[i] == _FRAME_SYNC:
+            if n - i < size:
+                break  # Partial frame; finish it on the next read
+            _, mm1, mm2, check = _FRAME.unpack_from(buf, i)
+            if buf[i + 1] ^ buf[i + 2] ^ buf[i + 3] ^ buf[i + 4] == check:
+                dist = (mm1 / 10, mm2 / 10)
+                i += size
+                continue
+        elif buf.startswith(_ACK_LINE, i):
+            acks += 1
+            i += len(_ACK_LINE)
+            continue
+        elif n - i < len(_ACK_LINE) and _ACK_LINE.startswith(buf[i:]):
+            break  # Partial ACK line
+        # Not a frame or an ACK; resync on the next sync byte or ACK
+        i += 1
+        next_sync = buf.find(_FRAME_SYNC, i)
+        next_ack = buf.find(_ACK_LINE[:1], i)
+        i = min(j for j in (next_sync, next_ack, n) if j >= 0)
+    del buf[:i]  # Keep a partial frame or ACK for the next read
+    return dist, acks
+
 class MotorController:
-    def __init__(self, port='/dev/ttyACM0', baudrate=115200, timeout=0.1):
+    def __init__(self, port='/dev/ttyACM0', baudrate=115200, timeout=0.1, ramp_time=0.0, ramp_steps=15,
+                 binary=False):
         """
         Initialize motor controller
         
@@ -16,14 +105,41 @@ class MotorController:
             port: Serial port (usually /dev/ttyACM0 or /dev/ttyUSB0)
             baudrate: Communication speed (must match Arduino - 115200)
             timeout: Read timeout in seconds
+            ramp_time: Seconds setRPM takes to ramp to a new target (0 = jump)
+            ramp_steps: Number of intermediate RPM targets sent during a ramp
+            binary: Arduino sends binary telemetry frames instead of text lines
+                    (BINARY_TELEMETRY 1; pair it with a higher SERIAL_BAUD)
         """
         self.arduino = None
+        self._key = None  # Pool key of the connection this controller holds
+        self.binary = binary
+        self.ramp_time = ramp_time
+        self.ramp_steps = ramp_steps
+        self._rpm = (0, 0)  # Last RPM targets sent to the Arduino
+        
+        # Latest distances, kept up to date by the reader thread
+        self._dist = (None, None)
+        self._dist_fresh = False  # True until getDist() returns self._dist
+        self._dist_cond = threading.Condition()
+        self._reader = None
+        self._reading = False
+        
+        # Commands written and ACK lines read; a command is applied once
+        # _acked has caught up with the count when it was sent
+        self._ack_cond = threading.Condition()
+        self._sent = 0
+        self._acked = 0
+        
         self.connect(port, baudrate, timeout)
     
     def connect(self, port='/dev/ttyACM0', baudrate=115200, timeout=0.1):
         """
         Establish connection with Arduino
         
+        Reuses the pooled connection to the same port if it is still open,
+        unless another MotorController holds it. Starts the reader thread
+        that keeps getDist() current.
+        
         Args:
             port: Serial port
             baudrate: Communication speed
@@ -32,12 +148,34 @@ class MotorController:
         Returns:
             bool: True if connected successfully, False otherwise
         """
+        self._release()
+        key = (port, baudrate)
+        with _pool_lock:
+            if key in _in_use:
+                print(f"{port} is already in use by another MotorController")
+                self.arduino = None
+                return False
+            _in_use.add(key)  # Reserved while opening, too
+            ser = _pool.get(key)
+        self._key = key
+        
+        if ser is not None and ser.is_open:
+            ser.timeout = timeout
+            self.arduino = ser
+            self.arduino.flushInput()
+            self._start_reader()
+            return True
+        
         try:
             self.arduino = serial.Serial(port, baudrate, timeout=timeout)
             time.sleep(2)  # Wait for Arduino to reset after connection
             
+            with _pool_lock:
+                _pool[key] = self.arduino
+            
             # Clear initial buffer
             self.arduino.flushInput()
+            self._start_reader()
             
             return True
         except serial.SerialException as e:
@@ -45,15 +183,26 @@ class MotorController:
             print("Make sure Arduino is connected and check the port name.")
             print("Common ports: /dev/ttyACM0, /dev/ttyACM1, /dev/ttyUSB0")
             self.arduino = None
+            self._release()
             return False
     
-    def setRPM(self, rpm1, rpm2):
+    def _release(self):
+        """Give the pooled connection back, so another MotorController can use it"""
+        self._stop_reader()
+        if self._key is not None:
+            with _pool_lock:
+                _in_use.discard(self._key)
+            self._key = None
+    
+    def setRPM(self, rpm1, rpm2, smooth=None):
         """
         Set target RPM for both motors
         
         Args:
             rpm1: Target RPM for motor 1 (float)
             rpm2: Target RPM for motor 2 (float)
+            smooth: Ramp from the current targets over ramp_time
+                    (None = ramp whenever ramp_time > 0)
         
         Returns:
             bool: True if successful, False otherwise
@@ -62,12 +211,26 @@ class MotorController:
             print("No serial connection available")
             return False
         
+        if smooth is None:
+            smooth = self.ramp_time > 0
+        
         try:
-            # Send RPM values as comma-separated string with newline
+            if smooth and self.ramp_steps > 0:
+                self._ramp(rpm1, rpm2)
+            
+            # Send RPM values as comma-separated string with newline, and
+            # wait until the Arduino has applied them
             message = f"{rpm1},{rpm2}\n"
-            self.arduino.write(message.encode('utf-8'))
-            time.sleep(0.2)
-            self.arduino.flushInput()
+            sent = self._send(message)
+            self._rpm = (rpm1, rpm2)
+            with self._ack_cond:
+                if not self._ack_cond.wait_for(lambda: self._acked >= sent, _ACK_TIMEOUT):
+                    print("No ACK from Arduino")
+                    self._acked = sent  # Don't let the lost ACK delay later commands
+            
+            # Only report distances measured after the new targets settled
+            with self._dist_cond:
+                self._dist_fresh = False
             
             return True
             
@@ -75,33 +238,118 @@ class MotorController:
             print(f"Error setting RPM: {e}")
             return False
     
+    def _send(self, message):
+        """
+        Write one RPM command to the Arduino
+        Returns: number of commands sent so far, including this one
+        """
+        with self._ack_cond:
+            self.arduino.write(message.encode('utf-8'))
+            self._sent += 1
+            return self._sent
+    
+    def _ramp(self, rpm1, rpm2):
+        """
+        Send the intermediate RPM targets between the current and the new
+        targets, one every ramp_time / ramp_steps seconds, and return when
+        the final target is due (setRPM sends it)
+        """
+        # Whole schedule computed up front; each step only formats and writes
+        start1, start2 = self._rpm
+        path1 = np.linspace(start1, rpm1, self.ramp_steps + 1)[1:-1].tolist()
+        path2 = np.linspace(start2, rpm2, self.ramp_steps + 1)[1:-1].tolist()
+        dt = self.ramp_time / self.ramp_steps
+        
+        deadline = time.monotonic()
+        for step1, step2 in zip(path1, path2):
+            deadline += dt
+            _sleep_until(deadline)
+            self._send(f"{step1:.2f},{step2:.2f}\n")
+            self._rpm = (step1, step2)
+        _sleep_until(deadline + dt)  # Final target is due
+    
+    def _start_reader(self):
+        """Start the thread that reads the Arduino's distance lines"""
+        self._stop_reader()
+        self._reading = True
+        self._reader = threading.Thread(target=self._read_loop, args=(self.arduino,), daemon=True)
+        self._reader.start()
+    
+    def _stop_reader(self):
+        """Stop the reader thread (returns within one serial read timeout)"""
+        self._reading = False
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+    
+    def _read_loop(self, ser):
+        """
+        Reader thread: blocks in read() until the Arduino sends data, then
+        stores the newest distance line (or frame, in binary mode) and
+        signals ACK lines. Everything waiting is read with one read() call.
+        """
+        buf = bytearray()  # Bytes read, not yet a full line
+        while self._reading:
+            try:
+                data = ser.read(max(1, ser.in_waiting))
+            except (serial.SerialException, OSError, TypeError) as e:
+                if self._reading:
+                    print(f"Error reading distance: {e}")
+                break
+            if not data:
+                continue  # Read timed out; check self._reading again
+            
+            buf += data
+            if self.binary:
+                dist, acks = parse_frames(buf)
+            else:
+                end = buf.rfind(b'\n')
+                if end < 0:
+                    continue  # No complete line yet
+                lines = buf[:end].split(b'\n')
+                del buf[:end + 1]  # Keep the partial line for the next read
+                
+                acks = sum(1 for raw in lines if raw.rstrip() == b"ACK")
+                dist = None
+                for raw in reversed(lines):
+                    dist = _parse_dist(raw)
+                    if dist is not None:
+                        break
+            
+            if acks:
+                with self._ack_cond:
+                    # Capped so an ACK that came after its wait timed out
+                    # can't count for a later command
+                    self._acked = min(self._acked + acks, self._sent)
+                    self._ack_cond.notify_all()
+            
+            if dist is not None:
+                with self._dist_cond:
+                    self._dist = dist
+                    self._dist_fresh = True
+                    self._dist_cond.notify_all()
+    
     def getDist(self):
         """
         Get current distance measurements from both motors
-        Reads the periodic output from Arduino
+        
+        Returns the newest reading stored by the reader thread, so this never
+        touches the serial port. Each reading is returned once.
         
         Returns:
-            tuple: (distanceCm1, distanceCm2) or (None, None) if error
+            tuple: (distanceCm1, distanceCm2) or (None, None) if there is no
+            new reading
         """
-        if self.arduino is None:
-            return None, None
-        
-        try:
-            if self.arduino.in_waiting > 0:
-                line = self.arduino.readline().decode('utf-8').strip()
-                if "Dist1(cm):" in line:
-                    parts = line.split(',')
-                    d1, d2 = None, None
-                    for part in parts:
-                        if "Dist1(cm):" in part:
-                            d1 = float(part.split(':')[1])
-                        elif "Dist2(cm):" in part:
-                            d2 = float(part.split(':')[1])
-                    return d1, d2
-            return None, None
-        except Exception as e:
-            print(f"Error reading distance: {e}")
-            return None, None
+        with self._dist_cond:
+            if not self._dist_fresh:
+                return None, None
+            self._dist_fresh = False
+            return self._dist
+    
+    def _wait_dist(self, timeout):
+        """Wait up to timeout seconds for a reading getDist() hasn't returned"""
+        with self._dist_cond:
+            self._dist_cond.wait_for(lambda: self._dist_fresh, timeout)
     
     def setBothMotors(self, rpm1, rpm2, time1, time2):
         """
@@ -121,26 +369,38 @@ class MotorController:
         
         # Run for the maximum duration to capture both motors
         max_time = max(time1, time2)
-        start = time.time()
+        start = time.monotonic()
         final_d1, final_d2 = None, None
         
         # Track when each motor should stop
         motor1_stopped = False
         motor2_stopped = False
         
-        while time.time() - start < max_time:
-            elapsed = time.time() - start
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= max_time:
+                break
             
             # Stop motor 1 when its time is up
             if not motor1_stopped and elapsed >= time1:
-                self.arduino.write(f"0,{rpm2}\n".encode('utf-8'))
+                self._send(f"0,{rpm2}\n")
+                self._rpm = (0, rpm2)
                 motor1_stopped = True
             
             # Stop motor 2 when its time is up
             if not motor2_stopped and elapsed >= time2:
-                self.arduino.write(f"{rpm1},0\n".encode('utf-8'))
+                self._send(f"{rpm1},0\n")
+                self._rpm = (rpm1, 0)
                 motor2_stopped = True
             
+            # Sleep until a new reading arrives or the next stop is due
+            next_event = max_time
+            if not motor1_stopped:
+                next_event = min(next_event, time1)
+            if not motor2_stopped:
+                next_event = min(next_event, time2)
+            self._wait_dist(next_event - elapsed)
+            
             # Get distance readings
             d1, d2 = self.getDist()
             if d1 is not None:
@@ -151,27 +411,74 @@ class MotorController:
         
         return final_d1, final_d2
     
+    def moveDistance(self, rpm1, rpm2, distance, timeout=None):
+        """
+        Run both motors until the wheels have travelled the given distance,
+        measured by the Arduino's encoder odometry, then stop
+        
+        Unlike a timed move, this doesn't drift with battery voltage or the
+        RPM-to-speed error of the wheels.
+        
+        Args:
+            rpm1: Target RPM for motor 1
+            rpm2: Target RPM for motor 2
+            distance: Distance in cm (mean of both wheels)
+            timeout: Stop after this many seconds even if short (None = no limit)
+        
+        Returns:
+            float: Distance travelled in cm, or None if there is no reading
+        """
+        # Odometry is cumulative; measure from the latest reading
+        with self._dist_cond:
+            self._dist_cond.wait_for(lambda: self._dist[0] is not None, 1.0)
+            start1, start2 = self._dist
+        if start1 is None or start2 is None:
+            print("No distance reading from Arduino")
+            return None
+        
+        self.setRPM(rpm1, rpm2)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        travelled = 0.0
+        
+        while travelled < distance:
+            wait = 0.5
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    print(f"Move timed out after {travelled:.1f} of {distance:.1f} cm")
+                    break
+            self._wait_dist(wait)
+            
+            d1, d2 = self.getDist()
+            if d1 is not None and d2 is not None:
+                travelled = (abs(d1 - start1) + abs(d2 - start2)) / 2
+        
+        self.stop()
+        return travelled
+    
     def stop(self, duration=None):
         """
-        Stop both motors
+        Stop both motors (immediately, without a ramp)
         
         Args:
-            duration: Time in seconds to keep motors stopped (None = brief stop)
+            duration: Time in seconds to keep motors stopped (None = return
+                      once the Arduino has acknowledged the stop)
         """
-        self.setRPM(0, 0)
+        self.setRPM(0, 0, smooth=False)
         if duration is not None:
             time.sleep(duration)
-        else:
-            time.sleep(0.2)
     
     def close(self):
         """
-        Close the serial connection
+        Stop the motors and release the serial connection
+        
+        The port stays open in the pool for the next MotorController;
+        close_all() closes it at exit.
         """
         if self.arduino and self.arduino.is_open:
             self.stop()
-            self.arduino.close()
-            print("Arduino connection closed")
+        self._release()
+        self.arduino = None
     
     def __enter__(self):
         """Context manager entry"""
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Motor Runner
+Runs a sequence of motor moves through MotorController, with the distance
+traveled printed after each move.
+
+Usage:
+  python -m motor_runner --seq forward30:3,stop:2,reverse30:3
+  python -m motor_runner --seq right15:3,left15:3 --port /dev/ttyACM1
+
+Each step is <move><rpm>:<seconds>, where move is forward, reverse, right or
+left (stop takes no rpm). Back-to-back steps with the same move and rpm run
+as one continuous move. With --monitor the distances are also printed live
+while each move runs; with --save FILE every sample is written to a CSV file
+once the sequence ends (or to a compressed NumPy archive if FILE ends in
+.npz). --preview prints the pose each step should reach,
+dead-reckoned from the RPMs, without connecting to the Arduino.
+
+The sequence runs as an asyncio coroutine: blocking serial calls go to a
+worker thread and the stop pauses use asyncio.sleep, so the event loop stays
+free. Distance samples go through a bounded queue to a separate printer task,
+so a slow terminal never holds up the sampling.
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+import warnings
+from collections import namedtuple
+import numpy as np
+from motorControl.controller import MotorController
+
+Step = namedtuple('Step', 'rpm1 rpm2 duration')
+
+# Move name -> (motor1 sign, motor2 sign)
+MOVES = {
+    'forward': (1, 1),
+    'reverse': (-1, -1),
+    'right': (1, -1),   # differential drive: motor1 forward, motor2 reverse
+    'left': (-1, 1),
+    'stop': (0, 0),
+}
+
+# Distance sampling period during a move (seconds)
+SAMPLE_PERIOD = 0.05
+
+# Samples waiting to be printed; newer samples are dropped while it is full
+SAMPLE_QUEUE_SIZE = 64
+
+# Longest time a printed sample waits in the stdout buffer (seconds)
+SAMPLE_FLUSH_INTERVAL = 0.25
+
+# Robot geometry for --preview (cm)
+WHEEL_DIAMETER = 18.6    # as in PID_with_odometry.ino
+WHEEL_SEPARATION = 52.0  # as in gui_final.py
+
+# time.sleep calls longer than this on the event loop thread get a warning
+BLOCKING_SLEEP_WARN = 0.001
+
+def _warn_blocking_sleep(event, args):
+    """
+    Audit hook: warn when a time.sleep would block the running event loop
+    (serial calls must go through asyncio.to_thread). The time.sleep audit
+    event exists from Python 3.12; on older versions this never fires.
+    """
+    if event == 'time.sleep' and args[0] > BLOCKING_SLEEP_WARN and asyncio._get_running_loop() is not None:
+        warnings.warn(f"blocking time.sleep({args[0]}) in the event loop", RuntimeWarning, stacklevel=2)
+
+sys.addaudithook(_warn_blocking_sleep)
+
+_STEP_RE = re.compile(r'([a-z]+)(\d*\.?\d*):(\d*\.?\d+)$')
+
+def parse_step(text):
+    """Parse one step, e.g. 'forward30:3' -> Step(30.0, 30.0, 3.0)"""
+    match = _STEP_RE.match(text.strip().lower())
+    if match is None or match.group(1) not in MOVES:
+        raise ValueError(f"Bad step '{text}' (expected e.g. forward30:3 or stop:2)")
+    name, rpm, duration = match.groups()
+    if name != 'stop' and not rpm:
+        raise ValueError(f"Step '{text}' needs an rpm (e.g. {name}30:3)")
+    sign1, sign2 = MOVES[name]
+    rpm = float(rpm) if rpm else 0.0
+    return Step(sign1 * rpm, sign2 * rpm, float(duration))
+
+def coalesce_steps(steps):
+    """
+    Merge consecutive steps with the same RPMs into one step with the summed
+    duration, so the motors don't stop and restart between them
+    """
+    merged = []
+    for step in steps:
+        if merged and merged[-1][:2] == step[:2]:
+            merged[-1] = merged[-1]._replace(duration=merged[-1].duration + step.duration)
+        else:
+            merged.append(step)
+    return merged
+
+def plan_poses(steps):
+    """
+    Dead-reckon the pose after each step from its RPMs and duration, for all
+    steps at once. Exact for straight moves and turns in place.
+    Returns an (N, 3) array of (x cm, y cm, heading degrees) rows; the robot
+    starts at the origin facing +x, and left turns are positive.
+    """
+    rpm1, rpm2, duration = np.array(steps, dtype=np.float64).reshape(-1, 3).T
+    cm_per_rpm_s = np.pi * WHEEL_DIAMETER / 60
+    d1 = rpm1 * duration * cm_per_rpm_s
+    d2 = rpm2 * duration * cm_per_rpm_s
+    
+    turn = (d2 - d1) / WHEEL_SEPARATION   # radians per step
+    heading = np.cumsum(turn)
+    course = heading - turn / 2           # mean heading during each step
+    travel = (d1 + d2) / 2
+    x = np.cumsum(travel * np.cos(course))
+    y = np.cumsum(travel * np.sin(course))
+    return np.column_stack((x, y, np.degrees(heading)))
+
+def print_plan(steps):
+    """Print the dead-reckoned pose after each step"""
+    for number, (step, (x, y, heading)) in enumerate(zip(steps, plan_poses(steps)), 1):
+        print(f"{number:3d}. {step_label(step):32s} {step.duration:6g}s -> "
+              f"x={x:8.1f} cm  y={y:8.1f} cm  heading={heading:7.1f} deg")
+
+def step_label(step):
+    """Human-readable name of a step, e.g. 'Moving FORWARD at 30 RPM'"""
+    signs = ((step.rpm1 > 0) - (step.rpm1 < 0), (step.rpm2 > 0) - (step.rpm2 < 0))
+    for name, move_signs in MOVES.items():
+        if move_signs == signs:
+            break
+    else:
+        return f"Running at {step.rpm1}/{step.rpm2} RPM"
+    if name == 'stop':
+        return "STOPPING"
+    verb = "Turning" if name in ('right', 'left') else "Moving"
+    return f"{verb} {name.upper()} at {abs(step.rpm1):g} RPM"
+
+async def print_samples(queue, out):
+    """
+    Write (elapsed, dist1, dist2) samples from the queue to out until
+    cancelled. Lines collect in out's buffer and are flushed at most every
+    SAMPLE_FLUSH_INTERVAL, instead of one write() per line.
+    """
+    last_flush = time.monotonic()
+    while True:
+        elapsed, d1, d2 = await queue.get()
+        out.write(b"%.2fs - Motor 1: %.2f cm, Motor 2: %.2f cm\n" % (elapsed, d1, d2))
+        queue.task_done()
+        now = time.monotonic()
+        if now - last_flush >= SAMPLE_FLUSH_INTERVAL:
+            out.flush()
+            last_flush = now
+
+async def move(motor, step, monitor=False):
+    """
+    Run both motors for the step duration and print the distance traveled.
+    Returns the samples as a float32 array of (elapsed, dist1, dist2) rows.
+    """
+    print(f"{step_label(step)} for {step.duration:g} seconds...")
+    
+    # Preallocated, so recording a sample is one row assignment (no formatting)
+    samples = np.empty((int(step.duration / SAMPLE_PERIOD) + 2, 3), dtype=np.float32)
+    count = 0
+    
+    queue = printer = None
+    if monitor:
+        # Samples bypass print() and go straight to the binary stdout buffer
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        queue = asyncio.Queue(maxsize=SAMPLE_QUEUE_SIZE)
+        printer = asyncio.create_task(print_samples(queue, out))
+    
+    try:
+        await asyncio.to_thread(motor.setRPM, step.rpm1, step.rpm2)
+        
+        # Sampling-loop names bound to locals once, instead of looked up every sample
+        get_dist = motor.getDist
+        monotonic = time.monotonic
+        sleep = asyncio.sleep
+        period = SAMPLE_PERIOD
+        capacity = len(samples)
+        
+        # Sample on absolute deadlines; getDist() only returns the reader thread's latest reading
+        start = deadline = monotonic()
+        end = start + step.duration
+        d1, d2 = None, None
+        while deadline < end:
+            now = monotonic()  # One timestamp per sample, used for both elapsed and the sleep
+            s1, s2 = get_dist()
+            if s1 is not None:
+                d1, d2 = s1, s2
+                if s2 is not None:
+                    elapsed = now - start
+                    if count < capacity:
+                        samples[count] = (elapsed, s1, s2)
+                        count += 1
+                    if queue is not None:
+                        try:
+                            queue.put_nowait((elapsed, s1, s2))
+                        except asyncio.QueueFull:
+                            pass  # Printer is behind; keep sampling
+            deadline += period
+            await sleep(max(0.0, min(deadline, end) - now))
+        
+        await asyncio.to_thread(motor.stop)
+        if queue is not None:
+            await queue.join()
+    finally:
+        if printer is not None:
+            printer.cancel()
+            out.flush()
+    
+    print(f"Distance traveled - Motor1: {d1} cm, Motor2: {d2} cm\n")
+    return samples[:count]
+
+def save_samples(path, recorded):
+    """
+    Write (step number, samples) pairs to a file in one go: CSV text, or for
+    a .npz path one compressed array per column (step, elapsed_s, dist1_cm,
+    dist2_cm), which np.load reads back without any parsing
+    """
+    rows = [np.column_stack((np.full(len(samples), number, dtype=np.float32), samples))
+            for number, samples in recorded]
+    data = np.concatenate(rows) if rows else np.empty((0, 4), dtype=np.float32)
+    if path.endswith('.npz'):
+        np.savez_compressed(path, step=data[:, 0].astype(np.uint16), elapsed_s=data[:, 1],
+                            dist1_cm=data[:, 2], dist2_cm=data[:, 3])
+    else:
+        np.savetxt(path, data, fmt=('%d', '%.3f', '%.2f', '%.2f'), delimiter=',',
+                   header="step,elapsed_s,dist1_cm,dist2_cm", comments='')
+    print(f"Saved {len(data)} samples to {path}")
+
+async def pause(motor, duration):
+    """Stop both motors and wait duration seconds"""
+    print(f"STOPPING for {duration:g} seconds...")
+    await asyncio.to_thread(motor.setRPM, 0, 0)
+    await asyncio.sleep(duration)
+
+async def run_sequence(steps, port='/dev/ttyACM0', baudrate=115200, monitor=False, save=None):
+    """
+    Connect to the Arduino and run the steps in order.
+    If save is a path, the distance samples of every move are written there.
+    """
+    # Initialize motor controller (waits for the Arduino reset on first use)
+    print("Initializing motor controller...")
+    motor = await asyncio.to_thread(MotorController, port=port, baudrate=baudrate)
+    
+    if motor.arduino is None:
+        print("Failed to connect to Arduino. Exiting.")
+        return
+    
+    print("Motor controller initialized successfully!")
+    print("\nStarting motor test sequence...\n")
+    
+    steps = coalesce_steps(steps)
+    recorded = []
+    try:
+        for number, step in enumerate(steps, 1):
+            if step.rpm1 == 0 and step.rpm2 == 0:
+                await pause(motor, step.duration)
+            else:
+                recorded.append((number, await move(motor, step, monitor)))
+        
+        # Final stop
+        print("STOPPING - Test sequence complete!")
+        await asyncio.to_thread(motor.stop)
+        
+        print("\nMotor test sequence completed successfully!")
+        
+    except asyncio.CancelledError:
+        print("\n\nTest interrupted by user")
+        await asyncio.to_thread(motor.stop)
+    except Exception as e:
+        print(f"\nError during test: {e}")
+        await asyncio.to_thread(motor.stop)
+    finally:
+        await asyncio.to_thread(motor.close)
+        if save is not None:
+            save_samples(save, recorded)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a sequence of motor moves")
+    parser.add_argument('--seq', required=True,
+                        help="comma-separated steps, e.g. forward30:3,stop:2,left15:3")
+    parser.add_argument('--port', default='/dev/ttyACM0', help="Arduino serial port")
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--monitor', action='store_true',
+                        help="print the distances live while each move runs")
+    parser.add_argument('--save', metavar='FILE',
+                        help="write every distance sample to this CSV (or .npz) file")
+    parser.add_argument('--preview', action='store_true',
+                        help="print the planned pose after each step and exit")
+    args = parser.parse_args(argv)
+    
+    try:
+        steps = [parse_step(text) for text in args.seq.split(',') if text.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.preview:
+        print_plan(coalesce_steps(steps))
+        return
+    
+    try:
+        asyncio.run(run_sequence(steps, args.port, args.baudrate, args.monitor, args.save))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
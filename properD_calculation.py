@@ -3,35 +3,149 @@
 Motor control with movement functions
 """
 
+import collections
+import re
 import serial
+import serial.threaded
+import threading
 import time
 
-# Connect to Arduino
-arduino = serial.Serial('/dev/ttyACM0', 115200, timeout=0.1)
-time.sleep(2)
+from motorControl.controller import parse_frames
 
-# Clear initial buffer
-arduino.flushInput()
+# Longest wait for the Arduino's ACK after an RPM command (seconds)
+ACK_TIMEOUT = 0.5
+
+# Distances in a telemetry line, matched on the raw bytes
+DIST_PATTERN = re.compile(rb"Dist1\(cm\):(-?[\d.]+),Dist2\(cm\):(-?[\d.]+)")
+
+# Telemetry format, must match BINARY_TELEMETRY in PID_with_odometry.ino.
+# Binary frames are parsed by motorControl's parse_frames.
+BINARY_TELEMETRY = False
+
+class Telemetry(serial.threaded.Protocol):
+    """
+    Runs in the serial ReaderThread: keeps the newest distance readings and
+    counts the Arduino's ACK lines, so the move functions never touch the port
+    """
+    def __init__(self):
+        self.buffer = bytearray()  # Bytes not yet parsed
+        self.latest = collections.deque(maxlen=16)  # (d1, d2) readings, newest last
+        self.fresh = threading.Event()  # Set when a reading arrives
+        
+        # Commands sent and ACK lines received; setRPM waits for acked to
+        # reach its own command's number
+        self.ack_cond = threading.Condition()
+        self.sent = 0
+        self.acked = 0
+    
+    def data_received(self, data):
+        buf = self.buffer
+        buf += data
+        if BINARY_TELEMETRY:
+            dist, acks = parse_frames(buf)
+            if dist is not None:
+                self.latest.append(dist)
+                self.fresh.set()
+        else:
+            end = buf.rfind(b'\n')
+            if end < 0:
+                return  # No complete line yet
+            acks = 0
+            for line in buf[:end].split(b'\n'):
+                if line.rstrip() == b"ACK":
+                    acks += 1
+                    continue
+                m = DIST_PATTERN.search(line)
+                if m is None:
+                    continue
+                try:
+                    self.latest.append((float(m.group(1)), float(m.group(2))))
+                except ValueError:
+                    continue  # Garbled number
+                self.fresh.set()
+            del buf[:end + 1]  # Keep the partial line for the next read
+        
+        if acks:
+            with self.ack_cond:
+                # Capped so a late ACK can't count for a later command
+                self.acked = min(self.acked + acks, self.sent)
+                self.ack_cond.notify_all()
+
+# Arduino connection, opened on first use so importing this module doesn't
+# grab the port or wait for the Arduino reset
+_arduino = None
+_reader = None
+_telemetry = None
+
+def _get():
+    """Return (arduino, telemetry), connecting on the first call"""
+    global _arduino, _reader, _telemetry
+    if _arduino is None:
+        arduino = serial.Serial('/dev/ttyACM0', 115200, timeout=0.1)
+        time.sleep(2)
+        
+        # Clear initial buffer
+        arduino.reset_input_buffer()
+        
+        # Read telemetry on a background thread from here on
+        _reader = serial.threaded.ReaderThread(arduino, Telemetry)
+        _reader.start()
+        _, _telemetry = _reader.connect()
+        _arduino = arduino
+    return _arduino, _telemetry
+
+def close():
+    """Stop the reader thread and close the connection, if it was opened"""
+    global _arduino, _reader, _telemetry
+    if _arduino is None:
+        return
+    _reader.stop()
+    _arduino.close()
+    _arduino = _reader = _telemetry = None
+    print("Connection closed")
 
 # Set RPM
 def setRPM(rpm1, rpm2):
-    arduino.write(f"{rpm1},{rpm2}\n".encode())
-    time.sleep(0.2)
-    arduino.flushInput()
+    """
+    Send the RPM targets and wait for the Arduino's ACK line
+    Returns: True if acknowledged within ACK_TIMEOUT, False otherwise
+    """
+    arduino, telemetry = _get()
+    with telemetry.ack_cond:
+        arduino.write(f"{rpm1},{rpm2}\n".encode())
+        telemetry.sent += 1
+        sent = telemetry.sent
+    arduino.flush()
+    
+    with telemetry.ack_cond:
+        if telemetry.ack_cond.wait_for(lambda: telemetry.acked >= sent, ACK_TIMEOUT):
+            return True
+        telemetry.acked = sent  # Don't let the lost ACK delay later commands
+    print("No ACK from Arduino")
+    return False
 
 # Get distance
-def getDist():
-    if arduino.in_waiting > 0:
-        line = arduino.readline().decode().strip()
-        if "Dist1(cm):" in line:
-            parts = line.split(',')
-            d1, d2 = None, None
-            for part in parts:
-                if "Dist1(cm):" in part:
-                    d1 = float(part.split(':')[1])
-                elif "Dist2(cm):" in part:
-                    d2 = float(part.split(':')[1])
-            return d1, d2
+def getDist(timeout=0.0):
+    """
+    Wait up to timeout seconds for a reading newer than the last call's
+    Returns: (distance1, distance2) in cm, or (None, None)
+    """
+    _, telemetry = _get()
+    if not telemetry.fresh.wait(timeout):
+        return None, None
+    telemetry.fresh.clear()
+    return telemetry.latest[-1]
+
+def track(duration):
+    """
+    Let the motors run for duration seconds; the reader thread keeps the
+    distances up to date meanwhile
+    Returns: last (distance1, distance2) in cm
+    """
+    _, telemetry = _get()
+    time.sleep(duration)
+    if telemetry.latest:
+        return telemetry.latest[-1]
     return None, None
 
 def forward(rpm, duration):
@@ -40,16 +154,7 @@ def forward(rpm, duration):
     Returns: (distance1, distance2) in cm
     """
     setRPM(rpm, rpm)
-    
-    start = time.time()
-    final_d1, final_d2 = None, None
-    
-    while time.time() - start < duration:
-        d1, d2 = getDist()
-        if d1 is not None:
-            final_d1, final_d2 = d1, d2
-    
-    return final_d1, final_d2
+    return track(duration)
 
 def backward(rpm, duration):
     """
@@ -57,16 +162,7 @@ def backward(rpm, duration):
     Returns: (distance1, distance2) in cm
     """
     setRPM(-rpm, -rpm)
-    
-    start = time.time()
-    final_d1, final_d2 = None, None
-    
-    while time.time() - start < duration:
-        d1, d2 = getDist()
-        if d1 is not None:
-            final_d1, final_d2 = d1, d2
-    
-    return final_d1, final_d2
+    return track(duration)
 
 def right(rpm, duration):
     """
@@ -74,16 +170,7 @@ def right(rpm, duration):
     Returns: (distance1, distance2) in cm
     """
     setRPM(rpm, -rpm)
-    
-    start = time.time()
-    final_d1, final_d2 = None, None
-    
-    while time.time() - start < duration:
-        d1, d2 = getDist()
-        if d1 is not None:
-            final_d1, final_d2 = d1, d2
-    
-    return final_d1, final_d2
+    return track(duration)
 
 def left(rpm, duration):
     """
@@ -91,16 +178,7 @@ def left(rpm, duration):
     Returns: (distance1, distance2) in cm
     """
     setRPM(-rpm, rpm)
-    
-    start = time.time()
-    final_d1, final_d2 = None, None
-    
-    while time.time() - start < duration:
-        d1, d2 = getDist()
-        if d1 is not None:
-            final_d1, final_d2 = d1, d2
-    
-    return final_d1, final_d2
+    return track(duration)
 
 def stop(duration=None):
     """
@@ -115,39 +193,39 @@ def stop(duration=None):
         time.sleep(0.2)
 
 # Main - Example usage
-try:
-    # Test forward
-    d1, d2 = forward(60, 3)
-    print(f"Forward complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
+if __name__ == "__main__":
+    try:
+        # Test forward
+        d1, d2 = forward(60, 3)
+        print(f"Forward complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
     
-    stop(1)
+        stop(1)
     
-    # Test right turn
-    d1, d2 = right(20, 2)
-    print(f"Right turn complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
+        # Test right turn
+        d1, d2 = right(20, 2)
+        print(f"Right turn complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
     
-    stop(1)
+        stop(1)
     
-    # Test backward
-    d1, d2 = backward(60, 3)
-    print(f"Backward complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
+        # Test backward
+        d1, d2 = backward(60, 3)
+        print(f"Backward complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
     
-    stop(1)
+        stop(1)
     
-    # Test left turn
-    d1, d2 = left(20, 2)
-    print(f"Left turn complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
+        # Test left turn
+        d1, d2 = left(20, 2)
+        print(f"Left turn complete - Final distances: D1={d1:.2f} cm, D2={d2:.2f} cm\n")
     
-    stop()
+        stop()
     
-    print("\nAll tests completed!")
+        print("\nAll tests completed!")
     
-except KeyboardInterrupt:
-    print("\nInterrupted!")
-    stop()
-except Exception as e:
-    print(f"\nError: {e}")
-    stop()
-finally:
-    arduino.close()
-    print("Connection closed")
+    except KeyboardInterrupt:
+        print("\nInterrupted!")
+        stop()
+    except Exception as e:
+        print(f"\nError: {e}")
+        stop()
+    finally:
+        close()
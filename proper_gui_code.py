@@ -15,6 +15,7 @@ import numpy as np
 import csv
 import re
 import os
+import json
 
 from motorControl.controller import MotorController
 from z_module import init_z_axis, z_axis, cleanup_z_axis
@@ -32,6 +33,7 @@ class RobotControlGUI:
         self.WHEEL_CIRCUMFERENCE = math.pi * self.WHEEL_DIAMETER
         self.Z_OFFSET = 31  # cm (home position)
         self.SCAN_WAIT_TIME = 6  # seconds
+        self.CAMERA_CACHE = os.path.expanduser('~/.eternal_ps_camera.json')  # Last working camera index
         
         # Control variables
         self.motor = None
@@ -51,8 +53,18 @@ class RobotControlGUI:
         self.in_scanning_mode = False
         self.scan_mode_active = False
         
+        # Log messages waiting for the next status box update
+        self.log_pending = []
+        self.log_lock = threading.Lock()
+        
         self.create_widgets()
         
+        # Open the Arduino connection in the background once the window is up,
+        # so its ~2 s reset wait doesn't freeze the GUI
+        self.motor_connecting = False
+        self.start_pending = False
+        self.root.after(50, self.connect_motor_async)
+        
     def create_widgets(self):
         """Create all GUI widgets"""
         
@@ -167,10 +179,25 @@ class RobotControlGUI:
         main_frame.rowconfigure(3, weight=1)
         
     def log(self, message):
-        """Add message to status text box"""
-        self.status_text.insert(tk.END, message + "\n")
-        self.status_text.see(tk.END)
+        """
+        Add message to status text box. Messages are batched and the box is
+        updated once per Tk idle pass, so bursts from the worker threads
+        don't hold up the mainloop.
+        """
         print(message)
+        with self.log_lock:
+            self.log_pending.append(message)
+            if len(self.log_pending) > 1:
+                return  # Update already scheduled
+        self.root.after_idle(self.flush_log)
+        
+    def flush_log(self):
+        """Append the batched log messages to the status text box"""
+        with self.log_lock:
+            text = "\n".join(self.log_pending) + "\n"
+            self.log_pending.clear()
+        self.status_text.insert(tk.END, text)
+        self.status_text.see(tk.END)
         
     def calculate_times(self):
         """Calculate time required for turn and linear movements"""
@@ -267,6 +294,40 @@ class RobotControlGUI:
             messagebox.showerror("Validation Error", str(e))
             return None
             
+    def connect_motor_async(self):
+        """Start opening the Arduino connection on a background thread"""
+        if self.motor_connecting or self.motor is not None:
+            return
+        self.motor_connecting = True
+        self.log("Connecting to Arduino...")
+        threading.Thread(target=self._connect_motor, daemon=True).start()
+        
+    def _connect_motor(self):
+        """Create the MotorController (background thread), then hand it to the Tk thread"""
+        try:
+            motor = MotorController(port='/dev/ttyACM0', baudrate=115200)
+            error = None if motor.arduino is not None else Exception("Failed to connect to Arduino")
+        except Exception as e:
+            motor, error = None, e
+        self.root.after(0, self._motor_connected, motor, error)
+        
+    def _motor_connected(self, motor, error):
+        """Store the new connection and finish a start requested meanwhile"""
+        self.motor_connecting = False
+        if error is None:
+            self.motor = motor
+            self.log("✓ Motor controller connected")
+        else:
+            self.log(f"✗ Error: {error}")
+        
+        if self.start_pending:
+            self.start_pending = False
+            if error is None:
+                self.start_system()
+            else:
+                messagebox.showerror("Connection Error", str(error))
+                self.start_btn.config(state=tk.NORMAL)
+        
     def start_system(self):
         """Initialize and start the robot system"""
         # Validate inputs
@@ -274,6 +335,14 @@ class RobotControlGUI:
         if validation is None:
             return
         
+        # Continue once the background Arduino connection is up
+        if self.motor is None:
+            self.start_pending = True
+            self.start_btn.config(state=tk.DISABLED)
+            self.log("Waiting for Arduino connection...")
+            self.connect_motor_async()  # Retries if the first attempt failed
+            return
+        
         positions, l_dist, l_rpm, t_rpm = validation
         
         self.log("="*50)
@@ -289,17 +358,7 @@ class RobotControlGUI:
         # Calculate movement times
         self.calculate_movement_times()
         
-        # Initialize motor controller
-        try:
-            self.log("Connecting to Arduino...")
-            self.motor = MotorController(port='/dev/ttyACM0', baudrate=115200)
-            if self.motor.arduino is None:
-                raise Exception("Failed to connect to Arduino")
-            self.log("✓ Motor controller initialized")
-        except Exception as e:
-            self.log(f"✗ Error: {e}")
-            messagebox.showerror("Connection Error", str(e))
-            return
+        self.log("✓ Motor controller initialized")
         
         # Initialize Z-axis
         try:
@@ -315,14 +374,10 @@ class RobotControlGUI:
         # Initialize camera and QR scanner
         try:
             self.log("Initializing camera...")
-            camera_index = self.find_available_camera()
-            if camera_index is None:
+            camera_index, self.cap = self.open_camera()
+            if self.cap is None:
                 raise Exception("No camera found")
             
-            self.cap = cv2.VideoCapture(camera_index)
-            if not self.cap.isOpened():
-                raise Exception("Could not open camera")
-            
             self.log(f"✓ Camera initialized (index {camera_index})")
             
             # Load existing grid
@@ -372,9 +427,7 @@ class RobotControlGUI:
         # Stop motors
         if self.motor:
             try:
-                self.motor.setRPM(0, 0)
-                time.sleep(0.2)
-                self.motor.close()
+                self.motor.stop()  # Connection stays open for the next start
                 self.log("✓ Motors stopped")
             except Exception as e:
                 self.log(f"✗ Motor stop error: {e}")
@@ -677,16 +730,38 @@ class RobotControlGUI:
             
     # ===== QR Scanner Functions =====
     
-    def find_available_camera(self, max_index=10):
-        """Find first available camera"""
-        for index in range(max_index):
+    def open_camera(self, max_index=10):
+        """
+        Open the first working camera, trying the index cached in
+        self.CAMERA_CACHE first. Returns (index, opened capture) or (None, None)
+        """
+        cached = None
+        try:
+            with open(self.CAMERA_CACHE, 'r') as f:
+                cached = json.load(f)['index']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # No camera has worked yet
+        
+        indices = list(range(max_index))
+        if cached in indices:
+            indices.remove(cached)
+            indices.insert(0, cached)
+        
+        for index in indices:
             cap = cv2.VideoCapture(index)
             if cap.isOpened():
+                # Try to read a frame to verify it actually works
                 ret, _ = cap.read()
-                cap.release()
                 if ret:
-                    return index
-        return None
+                    if index != cached:
+                        try:
+                            with open(self.CAMERA_CACHE, 'w') as f:
+                                json.dump({'index': index}, f)
+                        except OSError:
+                            pass  # Only costs a slower start next time
+                    return index, cap
+            cap.release()
+        return None, None
         
     def qr_scanner_thread(self):
         """QR scanner thread - runs continuously"""
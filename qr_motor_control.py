@@ -3,200 +3,264 @@
 QR Motor Control
 Moves to specified stages (in cm) and scans QR codes at each position
 Integrates Z-axis motor control with QR code scanning
+
+Usage:
+  python qr_motor_control.py                 # enter the positions interactively
+  python qr_motor_control.py 80,120,150      # or give them up front
+  STAGE_POSITIONS=80,120,150 python qr_motor_control.py
 """
 
 import cv2
+import collections
+from concurrent.futures import ThreadPoolExecutor
 from pyzbar.pyzbar import decode
 import numpy as np
-import csv
 import re
 import os
 import time
 import json
+import sys
 import threading
-from z_module import init_z_axis, z_axis, cleanup_z_axis
+from z_module import init_z_axis, z_axis, wait_z_axis, cleanup_z_axis
+# QR parsing, grid CSV and camera helpers shared with the standalone scanner
+from qr_scanner import (parse_qr_data, load_grid_from_csv, save_grid_to_csv,
+                        open_camera, prep_for_decode, shrink, code_outline,
+                        DECODE_INTERVAL, ROI_FRACTION, FULL_RES_AFTER)
+
+# Threads decoding frames in parallel with capture and display
+DECODE_WORKERS = 2
+
+# Frames decoded together in one pyzbar call
+DECODE_BATCH = 3
+
+# A frame whose 1/16-scale thumbnail differs from the last queued frame's by
+# less than this (mean grey levels) shows the same scene; once a code has
+# been read in it, it isn't decoded again for FULL_RES_AFTER
+STATIC_DIFF = 2.0
 
-def parse_qr_data(qr_text):
+# Longest wait at each stage for a new QR code (seconds)
+SCAN_WAIT = 6
+
+# Show the camera preview only when there is a display to show it on; set
+# QR_HEADLESS=1 to skip it anyway (scanning still runs, without the window)
+SHOW_PREVIEW = bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')) \
+    and not os.environ.get('QR_HEADLESS')
+
+def replay_journal(grid, journal_file):
     """
-    Parse QR code format: {"qr_raw_data": "R{rack}_S{shelf}_ITM{item}"}
-    or directly: R{rack}_S{shelf}_ITM{item}
-    Returns: (rack_number, shelf_number, item_number) or None if invalid
+    Apply the scans recorded in a journal left by an interrupted run to grid.
+    A line cut short by the interruption is skipped.
+    Returns: number of scans applied
     """
-    # Try to parse as JSON first
-    try:
-        data = json.loads(qr_text)
-        if isinstance(data, dict) and 'qr_raw_data' in data:
-            qr_text = data['qr_raw_data']
-    except (json.JSONDecodeError, ValueError):
-        # Not JSON, use original text
-        pass
-    
-    # Parse the actual QR code pattern
-    pattern = r'R(\d+)_S(\d+)_ITM(\d+)'
-    match = re.match(pattern, qr_text)
-    if match:
-        rack = int(match.group(1))
-        shelf = int(match.group(2))
-        item = int(match.group(3))
-        return (rack, shelf, item)
-    return None
+    count = 0
+    if not os.path.exists(journal_file):
+        return count
+    with open(journal_file, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                grid[(entry['r'], entry['s'])] = entry['i']
+            except (ValueError, KeyError, TypeError):
+                continue
+            count += 1
+    return count
 
-def load_grid_from_csv(csv_file='inventory_grid.csv'):
+def decode_stacked(images):
     """
-    Load existing grid from CSV file in matrix format.
-    Returns: dict with (rack, shelf) as key and item number as value
-    Ignores 'NIL' entries.
+    Decode same-size images with one pyzbar call by stacking them vertically.
+    Each code's coordinates are moved back into its own image, and a code
+    seen in several images is returned once.
     """
-    grid = {}
-    if os.path.exists(csv_file):
-        with open(csv_file, 'r', newline='') as f:
-            reader = csv.reader(f)
-            header = next(reader, None)
-            
-            if header and len(header) > 1:
-                shelves = []
-                for col in header[1:]:
-                    match = re.match(r'Shelf_(\d+)', col)
-                    if match:
-                        shelves.append(int(match.group(1)))
-                
-                for row in reader:
-                    if len(row) > 0:
-                        rack_match = re.match(r'Rack_(\d+)', row[0])
-                        if rack_match:
-                            rack = int(rack_match.group(1))
-                            
-                            for i, shelf in enumerate(shelves):
-                                if i + 1 < len(row) and row[i + 1].strip() and row[i + 1].strip() != 'NIL':
-                                    try:
-                                        item = int(row[i + 1])
-                                        grid[(rack, shelf)] = item
-                                    except ValueError:
-                                        continue
-    return grid
+    height = images[0].shape[0]
+    found = {}
+    for obj in decode(np.vstack(images)):
+        if obj.data in found:
+            continue
+        shift = obj.rect.top // height * height
+        found[obj.data] = obj._replace(
+            rect=obj.rect._replace(top=obj.rect.top - shift),
+            polygon=[point._replace(y=point.y - shift) for point in obj.polygon])
+    return list(found.values())
 
-def save_grid_to_csv(grid, csv_file='inventory_grid.csv'):
+def decode_center_batch(frames, full_res=False):
     """
-    Save grid to CSV file in matrix format.
+    Decode QR codes in the central ROI_FRACTION of each frame, where the code
+    sits at a scan position; pyzbar's work shrinks with the ROI area, and
+    the ROIs of all the frames go through a single pyzbar call.
+    The ROIs are decoded at half resolution (a quarter of the pixels), and
+    again at full resolution only if that finds nothing and full_res is set.
+    Returns: (decoded objects, (x, y) offset of the ROI, scale of the decoded
+    image coordinates to frame coordinates)
     """
-    if not grid:
-        with open(csv_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Database'])
-        return
-    
-    max_rack = max(rack for rack, shelf in grid.keys())
-    max_shelf = max(shelf for rack, shelf in grid.keys())
-    
-    racks = list(range(1, max_rack + 1))
-    shelves = list(range(1, max_shelf + 1))
-    
-    with open(csv_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        
-        header = ['Database'] + [f'Shelf_{shelf}' for shelf in shelves]
-        writer.writerow(header)
-        
-        for rack in racks:
-            row = [f'Rack_{rack}']
-            for shelf in shelves:
-                item = grid.get((rack, shelf), 'NIL')
-                row.append(item)
-            writer.writerow(row)
+    h, w = frames[0].shape[:2]
+    x0 = int(w * (1 - ROI_FRACTION) / 2)
+    y0 = int(h * (1 - ROI_FRACTION) / 2)
     
-    print(f"Grid saved to {csv_file}")
+    # Converted to grey once, before the resize, so every later pass runs on
+    # one channel; the images are binarized in place
+    grays = [cv2.cvtColor(frame[y0:h - y0, x0:w - x0], cv2.COLOR_BGR2GRAY) for frame in frames]
+    small = [shrink(gray) for gray in grays]
+    decoded_objects = decode_stacked([prep_for_decode(image, image) for image in small])
+    if decoded_objects or not full_res:
+        return decoded_objects, (x0, y0), 2
+    return decode_stacked([prep_for_decode(gray, gray) for gray in grays]), (x0, y0), 1
 
-def find_available_camera(max_index=10):
+def make_overlay(decoded_objects, offset, scale):
     """
-    Check camera indices from 0 to max_index and return the first available one.
+    Work out what draw_overlay() draws for each decoded code, once per
+    decode result rather than once per displayed frame
+    Returns: list of (outline, (x, y, width) of the label, label text)
     """
-    print("Searching for available cameras...")
-    for index in range(max_index):
-        cap = cv2.VideoCapture(index)
-        if cap.isOpened():
-            ret, _ = cap.read()
-            cap.release()
-            if ret:
-                print(f"✓ Found working camera at index {index}")
-                return index
-    print("✗ No working camera found")
-    return None
+    x0, y0 = offset
+    return [(code_outline(obj, offset, scale),
+             (obj.rect.left * scale + x0, obj.rect.top * scale + y0, obj.rect.width * scale),
+             f'{obj.type}: {obj.data.decode("utf-8")}')
+            for obj in decoded_objects]
 
-def qr_scanner_thread(cap, grid, csv_file, running_flag, previous_data):
-    """QR scanner thread - runs continuously like qr_scanner.py"""
-    while running_flag[0]:
-        ret, frame = cap.read()
-        
-        if not ret:
-            print("Error: Failed to capture frame")
-            break
+def draw_overlay(frame, overlay):
+    """Draw the outline, type and data of each decoded QR code on the frame"""
+    for outline, (x, y, w), label in overlay:
+        # Draw the bounding box around the QR code
+        cv2.polylines(frame, [outline], True, (0, 255, 0), 3)
         
-        # Decode QR codes in the frame
-        decoded_objects = decode(frame)
-        
-        # Process each detected QR code
-        for obj in decoded_objects:
-            qr_data = obj.data.decode('utf-8')
-            qr_type = obj.type
+        # Display the QR code type and data on a filled background
+        cv2.rectangle(frame, (x, y - 30), (x + w, y), (0, 255, 0), -1)
+        cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+
+def qr_scanner_thread(cap, grid, journal, running_flag, previous_data, new_code):
+    """
+    QR scanner thread - runs continuously like qr_scanner.py.
+    Frames are decoded on a worker pool (pyzbar releases the GIL while it
+    scans) so capture and display never wait for a decode; the newest
+    result is drawn on the live frames. new_code is set whenever a valid
+    code other than previous_data[0] is read. Parsed scans are appended to the
+    open journal file; main() writes the CSV. Without SHOW_PREVIEW frames
+    are only decoded, never drawn or shown.
+    """
+    last_decode = 0.0
+    last_found = time.monotonic()
+    pending = collections.deque()  # Decodes in flight, oldest first
+    batch = []                     # Frames waiting for the next decode
+    overlay = []                   # make_overlay() of the newest decode
+    seen_code = False              # Newest decode found a code
+    last_thumb = None              # Thumbnail of the last queued frame
+    
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+        while running_flag[0]:
+            # Grab every frame so the driver queue never goes stale, but only
+            # retrieve and show one every DECODE_INTERVAL
+            if not cap.grab():
+                print("Error: Failed to capture frame")
+                break
+            now = time.monotonic()
+            if now - last_decode < DECODE_INTERVAL:
+                continue
+            last_decode = now
             
-            # Get the bounding box coordinates
-            points = obj.polygon
+            ret, frame = cap.retrieve()
             
-            # If the points do not form a quad, find convex hull
-            if len(points) > 4:
-                hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                points = hull
+            if not ret:
+                print("Error: Failed to capture frame")
+                break
             
-            # Draw the bounding box around the QR code
-            n = len(points)
-            for j in range(n):
-                cv2.line(frame, tuple(points[j]), tuple(points[(j+1) % n]), (0, 255, 0), 3)
+            # Collect the decodes that have finished
+            while pending and pending[0].done():
+                decoded_objects, offset, scale = pending.popleft().result()
+                seen_code = bool(decoded_objects)
+                if seen_code:
+                    last_found = now
+                if SHOW_PREVIEW:
+                    overlay = make_overlay(decoded_objects, offset, scale)
+                
+                for obj in decoded_objects:
+                    qr_data = obj.data.decode('utf-8')
+                    
+                    # Print to console only when new code is detected
+                    if qr_data != previous_data[0]:
+                        print(f"\n{'='*50}")
+                        print(f"QR Code Type: {obj.type}")
+                        print(f"Data: {qr_data}")
+                        
+                        # Parse and update grid
+                        parsed = parse_qr_data(qr_data)
+                        if parsed:
+                            rack, shelf, item = parsed
+                            grid[(rack, shelf)] = item
+                            print(f"✓ Parsed: Rack {rack}, Shelf {shelf}, Item {item}")
+                            
+                            # Journal the scan; the CSV is rewritten once per run
+                            journal.write(f'{{"r": {rack}, "s": {shelf}, "i": {item}}}\n')
+                            journal.flush()
+                        else:
+                            print(f"✗ Invalid format. Expected: R{{rack}}_S{{shelf}}_ITM{{item}}")
+                        
+                        print(f"{'='*50}")
+                        previous_data[0] = qr_data
+                        if parsed:
+                            new_code.set()
             
-            # Draw a rectangle for the text background
-            x = obj.rect.left
-            y = obj.rect.top
-            w = obj.rect.width
-            h = obj.rect.height
+            # Skip frames of a scene that hasn't changed since it was read
+            thumb = frame[::16, ::16].astype(np.int16)
+            static = last_thumb is not None and np.abs(thumb - last_thumb).mean() < STATIC_DIFF
             
-            # Display the QR code type and data on the frame
-            cv2.rectangle(frame, (x, y - 30), (x + w, y), (0, 255, 0), -1)
-            cv2.putText(frame, f'{qr_type}: {qr_data}', (x, y - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+            # Queue a full batch for decoding once a worker is free, keeping
+            # the newest frames meanwhile; the overlay is drawn on a copy so
+            # the worker sees the untouched frame
+            if not (static and seen_code and now - last_found <= FULL_RES_AFTER):
+                batch.append(frame)
+                del batch[:-DECODE_BATCH]
+                last_thumb = thumb
+            if len(batch) == DECODE_BATCH and len(pending) < DECODE_WORKERS:
+                pending.append(pool.submit(decode_center_batch, batch, now - last_found > FULL_RES_AFTER))
+                batch = []
+            if not SHOW_PREVIEW:
+                continue
+            frame = frame.copy()
             
-            # Print to console only when new code is detected
-            if qr_data != previous_data[0]:
-                print(f"\n{'='*50}")
-                print(f"QR Code Type: {qr_type}")
-                print(f"Data: {qr_data}")
-                
-                # Parse and update grid
-                parsed = parse_qr_data(qr_data)
-                if parsed:
-                    rack, shelf, item = parsed
-                    grid[(rack, shelf)] = item
-                    print(f"✓ Parsed: Rack {rack}, Shelf {shelf}, Item {item}")
-                    
-                    # Save to CSV after each successful scan
-                    save_grid_to_csv(grid, csv_file)
-                else:
-                    print(f"✗ Invalid format. Expected: R{{rack}}_S{{shelf}}_ITM{{item}}")
-                
-                print(f"{'='*50}")
-                previous_data[0] = qr_data
-        
-        # Display the resulting frame
-        cv2.imshow('QR Code Scanner - Press Q to Quit', frame)
-        
-        # Break the loop when 'q' is pressed
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            running_flag[0] = False
-            break
+            # Mark the ROI and the newest decoded codes on the preview
+            h, w = frame.shape[:2]
+            roi_x = int(w * (1 - ROI_FRACTION) / 2)
+            roi_y = int(h * (1 - ROI_FRACTION) / 2)
+            cv2.rectangle(frame, (roi_x, roi_y), (w - roi_x, h - roi_y), (128, 128, 128), 1)
+            draw_overlay(frame, overlay)
+            
+            # Display the resulting frame
+            cv2.imshow('QR Code Scanner - Press Q to Quit', frame)
+            
+            # Break the loop when 'q' is pressed
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                running_flag[0] = False
+                break
     
-    cv2.destroyAllWindows()
+    if SHOW_PREVIEW:
+        cv2.destroyAllWindows()
+
+def parse_positions(text):
+    """
+    Parse stage positions in cm separated by commas and/or spaces, e.g.
+    "80,120 150". Entries that aren't numbers or are outside 31-185 cm are
+    reported and skipped.
+    Returns: list of positions in cm
+    """
+    positions = []
+    for entry in re.split(r'[,\s]+', text.strip()):
+        if not entry:
+            continue
+        try:
+            position = float(entry)
+        except ValueError:
+            print(f"✗ Invalid input '{entry}'. Enter numbers or 'stop'")
+            continue
+        if 31 <= position <= 185:
+            positions.append(position)
+        else:
+            print(f"✗ Position {entry} must be between 31 and 185 cm")
+    return positions
 
 def get_stage_positions():
     """
-    Get stage positions (in cm) from user input until 'stop' is entered.
+    Get stage positions (in cm) from user input until 'stop' is entered;
+    a line may hold several positions, e.g. "80, 120, 150".
     If user types 'stop' immediately, load from saved JSON file.
     Returns: list of positions in cm
     """
@@ -204,7 +268,7 @@ def get_stage_positions():
     positions = []
     
     print("\n" + "="*50)
-    print("Enter stage positions in cm (31-185 cm)")
+    print("Enter stage positions in cm (31-185 cm), one or more per line")
     print("Type 'stop' when done")
     print("="*50)
     
@@ -217,8 +281,8 @@ def get_stage_positions():
             # If first input is 'stop', load from saved file
             if first_input and os.path.exists(json_file):
                 try:
-                    with open(json_file, 'r') as f:
-                        saved_data = json.load(f)
+                    with open(json_file, 'rb') as f:
+                        saved_data = json.loads(f.read())
                         positions = saved_data.get('positions', [])
                         print(f"✓ Loaded {len(positions)} saved positions from {json_file}")
                         print(f"Positions: {positions}")
@@ -228,21 +292,17 @@ def get_stage_positions():
         
         first_input = False
         
-        try:
-            position = float(user_input)
-            if 31 <= position <= 185:
-                positions.append(position)
-                print(f"✓ Added position: {position} cm")
-            else:
-                print("✗ Position must be between 31 and 185 cm")
-        except ValueError:
-            print("✗ Invalid input. Enter a number or 'stop'")
+        for position in parse_positions(user_input):
+            positions.append(position)
+            print(f"✓ Added position: {position} cm")
     
     # Save positions to JSON file if new positions were entered
     if positions and not first_input:
         try:
+            # One compact dumps() call runs in the C encoder; indent or
+            # streaming with dump() would go through the Python one
             with open(json_file, 'w') as f:
-                json.dump({'positions': positions}, f, indent=2)
+                f.write(json.dumps({'positions': positions}))
             print(f"✓ Saved {len(positions)} positions to {json_file}")
         except Exception as e:
             print(f"✗ Error saving positions: {e}")
@@ -253,8 +313,13 @@ def main():
     csv_file = 'inventory_grid.csv'
     OFFSET = 31  # cm (home position)
     
-    # Get stage positions from user
-    positions = get_stage_positions()
+    # Stage positions from the command line or STAGE_POSITIONS (e.g.
+    # "80,120,150") for unattended runs, otherwise ask the user
+    text = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('STAGE_POSITIONS')
+    if text:
+        positions = parse_positions(text)
+    else:
+        positions = get_stage_positions()
     
     if not positions:
         print("No positions entered. Exiting.")
@@ -272,33 +337,43 @@ def main():
     print(f"Loaded {len(grid)} entries from {csv_file}")
     
     # Find and initialize camera
-    camera_index = find_available_camera()
-    if camera_index is None:
+    camera_index, cap = open_camera()
+    if cap is None:
         print("Error: Could not find any working camera")
         cleanup_z_axis()
         return
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep only the newest frame queued
     
-    cap = cv2.VideoCapture(camera_index)
+    # Scans are journaled during the run and folded into the CSV at the end;
+    # a journal still present is from a run that never got that far
+    journal_file = os.path.splitext(csv_file)[0] + '.jsonl'
+    recovered = replay_journal(grid, journal_file)
+    if recovered:
+        print(f"Recovered {recovered} scans from {journal_file}")
+        save_grid_to_csv(grid, csv_file)
+    journal = open(journal_file, 'w')
     
-    if not cap.isOpened():
-        print("Error: Could not open webcam")
-        cleanup_z_axis()
-        return
+    # Writes the CSV mid-run so the return home doesn't wait on the file
+    csv_writer = ThreadPoolExecutor(max_workers=1)
     
     # QR scanner state
     running_flag = [True]
     previous_data = [None]
+    new_code = threading.Event()  # Set by the scanner when a new code is read
     
     # Start QR scanner thread (exactly like qr_scanner.py)
     scanner_thread = threading.Thread(
         target=qr_scanner_thread, 
-        args=(cap, grid, csv_file, running_flag, previous_data), 
+        args=(cap, grid, journal, running_flag, previous_data, new_code), 
         daemon=True
     )
     scanner_thread.start()
     
     print("QR Code Scanner Started")
-    print("Press 'q' in camera window to quit")
+    if SHOW_PREVIEW:
+        print("Press 'q' in camera window to quit")
+    else:
+        print("Headless mode: no camera window, scanning stops after the last stage")
     print("Scanning for format: {\"qr_raw_data\": \"R{rack}_S{shelf}_ITM{item}\"}")
     print("Also accepts: R{rack}_S{shelf}_ITM{item}")
     
@@ -331,12 +406,20 @@ def main():
                 
                 print(f"Moving {direction_text} {distance:.1f} cm...")
                 z_axis(distance, direction)
+                wait_z_axis()  # z_axis only starts the move
                 current_position = target_position
                 print(f"✓ Reached position: {current_position} cm")
             
-            # Wait 6 seconds at this position for scanning
-            print(f"\nWaiting 6 seconds at position {current_position} cm for QR scanning...")
-            time.sleep(6)
+            # Wait at this position until the scanner reads a new code; cleared
+            # only now the move is over, so a code read on the way doesn't count
+            print(f"\nWaiting up to {SCAN_WAIT} seconds at position {current_position} cm for QR scanning...")
+            new_code.clear()
+            if not new_code.wait(SCAN_WAIT):
+                print(f"No new QR code at position {current_position} cm")
+        
+        # All stages scanned; write the CSV once for the whole pass, from a
+        # copy since the scanner keeps adding to grid
+        csv_writer.submit(save_grid_to_csv, dict(grid), csv_file)
         
         # Return to home position (offset = 31cm)
         if current_position != OFFSET:
@@ -356,17 +439,18 @@ def main():
             
             print(f"Moving {direction_text} {distance:.1f} cm...")
             z_axis(distance, direction)
+            wait_z_axis()
             current_position = OFFSET
             print(f"✓ Returned to home position: {OFFSET} cm")
         else:
             print(f"\nAlready at home position: {OFFSET} cm")
         
         print(f"\nAll movements complete! Final grid contains {len(grid)} entries")
-        print("QR scanner still running. Press 'q' in camera window to quit.")
         
-        # Keep running until user quits scanner
-        while running_flag[0]:
-            time.sleep(0.1)
+        # Keep running until user quits scanner (nobody can when headless)
+        if SHOW_PREVIEW:
+            print("QR scanner still running. Press 'q' in camera window to quit.")
+            scanner_thread.join()
     
     except KeyboardInterrupt:
         print("\n\nOperation interrupted by user")
@@ -377,13 +461,17 @@ def main():
     finally:
         # Cleanup
         running_flag[0] = False
-        time.sleep(0.5)
+        scanner_thread.join(timeout=1.0)  # Let it finish its frame before releasing the camera
         cap.release()
-        cv2.destroyAllWindows()
+        if SHOW_PREVIEW:
+            cv2.destroyAllWindows()
+        csv_writer.shutdown(wait=True)  # The final save below must be the last write
         cleanup_z_axis()
         
-        # Final save
+        # Final save; the journal is only needed until the CSV is written
         save_grid_to_csv(grid, csv_file)
+        journal.close()
+        os.remove(journal_file)
         print("\nQR Code Scanner Stopped")
         print(f"Final grid contains {len(grid)} entries")
         print("Cleanup complete")
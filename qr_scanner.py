@@ -5,26 +5,46 @@ import csv
 import re
 import os
 import json
+import time
 from collections import defaultdict
 
+# Frames are grabbed continuously but only retrieved (converted to BGR),
+# decoded and shown this often (seconds)
+DECODE_INTERVAL = 1 / 15
+
+# Central part of the frame searched for QR codes (fraction of width/height)
+ROI_FRACTION = 0.5
+
+# The ROI is decoded at half resolution first; after this long without a code
+# (seconds, half the 6 s scan wait per stage) misses are retried at full size
+FULL_RES_AFTER = 3.0
+
+# Index of the last camera that worked, tried first on the next start
+CAMERA_CACHE = os.path.expanduser('~/.eternal_ps_camera.json')
+
+# QR code payload, and the row and column labels of the inventory grid CSV
+QR_PATTERN = re.compile(r'R(\d+)_S(\d+)_ITM(\d+)')
+RACK_PATTERN = re.compile(r'Rack_(\d+)')
+SHELF_PATTERN = re.compile(r'Shelf_(\d+)')
+
 def parse_qr_data(qr_text):
     """
     Parse QR code format: {"qr_raw_data": "R{rack}_S{shelf}_ITM{item}"}
     or directly: R{rack}_S{shelf}_ITM{item}
     Returns: (rack_number, shelf_number, item_number) or None if invalid
     """
-    # Try to parse as JSON first
-    try:
-        data = json.loads(qr_text)
-        if isinstance(data, dict) and 'qr_raw_data' in data:
-            qr_text = data['qr_raw_data']
-    except (json.JSONDecodeError, ValueError):
-        # Not JSON, use original text
-        pass
+    # Try to parse as JSON first (only a JSON object can hold qr_raw_data)
+    if qr_text.lstrip().startswith('{'):
+        try:
+            data = json.loads(qr_text)
+            if isinstance(data, dict) and 'qr_raw_data' in data:
+                qr_text = data['qr_raw_data']
+        except (json.JSONDecodeError, ValueError):
+            # Not JSON, use original text
+            pass
     
     # Parse the actual QR code pattern
-    pattern = r'R(\d+)_S(\d+)_ITM(\d+)'
-    match = re.match(pattern, qr_text)
+    match = QR_PATTERN.match(qr_text)
     if match:
         rack = int(match.group(1))
         shelf = int(match.group(2))
@@ -39,36 +59,31 @@ def load_grid_from_csv(csv_file='inventory_grid.csv'):
     Ignores 'NIL' entries.
     """
     grid = {}
-    if os.path.exists(csv_file):
-        with open(csv_file, 'r', newline='') as f:
-            reader = csv.reader(f)
-            header = next(reader, None)  # Read header: Database, Shelf_1, Shelf_2, ...
-            
-            if header and len(header) > 1:
-                # Parse shelf numbers from header
-                shelves = []
-                for col in header[1:]:
-                    # Extract number from "Shelf_X"
-                    match = re.match(r'Shelf_(\d+)', col)
-                    if match:
-                        shelves.append(int(match.group(1)))
-                
-                # Read each rack row
-                for row in reader:
-                    if len(row) > 0:
-                        # Extract rack number from "Rack_X"
-                        rack_match = re.match(r'Rack_(\d+)', row[0])
-                        if rack_match:
-                            rack = int(rack_match.group(1))
-                            
-                            # Read items for each shelf
-                            for i, shelf in enumerate(shelves):
-                                if i + 1 < len(row) and row[i + 1].strip() and row[i + 1].strip() != 'NIL':
-                                    try:
-                                        item = int(row[i + 1])
-                                        grid[(rack, shelf)] = item
-                                    except ValueError:
-                                        continue
+    if not os.path.exists(csv_file):
+        return grid
+    with open(csv_file, 'r', newline='') as f:
+        rows = list(csv.reader(f))
+    
+    header = rows[0] if rows else []  # Database, Shelf_1, Shelf_2, ...
+    if len(header) < 2 or len(rows) < 2:
+        return grid
+    
+    # Shelf and rack numbers from the header row and the first column
+    shelves = np.array([int(m.group(1)) for m in map(SHELF_PATTERN.match, header[1:]) if m], dtype=int)
+    rows = [row for row in rows[1:] if row and RACK_PATTERN.match(row[0])]
+    if not rows or not len(shelves):
+        return grid
+    racks = np.array([int(RACK_PATTERN.match(row[0]).group(1)) for row in rows])
+    
+    # All item cells as one array (short rows padded with blanks), then the
+    # numeric ones picked out at once; blanks and NIL are skipped
+    width = len(shelves)
+    cells = np.char.strip(np.array([(row[1:] + [''] * width)[:width] for row in rows], dtype=str))
+    filled = np.char.isdigit(cells)
+    
+    rack_idx, shelf_idx = np.nonzero(filled)
+    keys = zip(racks[rack_idx].tolist(), shelves[shelf_idx].tolist())
+    grid.update(zip(keys, cells[filled].astype(int).tolist()))
     return grid
 
 def save_grid_to_csv(grid, csv_file='inventory_grid.csv'):
@@ -87,48 +102,109 @@ def save_grid_to_csv(grid, csv_file='inventory_grid.csv'):
             writer.writerow(['Database'])
         return
     
-    # Find max rack and shelf to create complete grid
-    max_rack = max(rack for rack, shelf in grid.keys())
-    max_shelf = max(shelf for rack, shelf in grid.keys())
+    # Fill a max_rack x max_shelf table with NIL, then drop every item into
+    # its cell in one indexed assignment (numbers below 1 have no cell)
+    entries = list(grid.items())  # One snapshot; a scanner thread may add entries
+    keys = np.array([key for key, _ in entries], dtype=int).reshape(-1, 2)
+    items = np.array([item for _, item in entries], dtype=object)
+    max_rack, max_shelf = keys.max(axis=0)
+    table = np.full((max_rack, max_shelf), 'NIL', dtype=object)
+    placed = (keys >= 1).all(axis=1)
+    table[keys[placed, 0] - 1, keys[placed, 1] - 1] = items[placed]
     
-    # Create complete range from 1 to max (fills in missing numbers)
-    racks = list(range(1, max_rack + 1))
-    shelves = list(range(1, max_shelf + 1))
+    header = ['Database'] + [f'Shelf_{shelf}' for shelf in range(1, max_shelf + 1)]
+    labels = np.array([f'Rack_{rack}' for rack in range(1, max_rack + 1)], dtype=object)
     
     with open(csv_file, 'w', newline='') as f:
         writer = csv.writer(f)
-        
-        # Write header row: Database, Shelf_1, Shelf_2, ...
-        header = ['Database'] + [f'Shelf_{shelf}' for shelf in shelves]
         writer.writerow(header)
-        
-        # Write each rack row
-        for rack in racks:
-            row = [f'Rack_{rack}']
-            for shelf in shelves:
-                item = grid.get((rack, shelf), 'NIL')
-                row.append(item)
-            writer.writerow(row)
+        writer.writerows(np.column_stack((labels, table)).tolist())
     
     print(f"Grid saved to {csv_file}")
 
-def find_available_camera(max_index=10):
+def open_camera(max_index=10):
     """
-    Check camera indices from 0 to max_index and return the first available one.
-    Returns: camera index or None if no camera found
+    Open the first working camera, trying the index that worked last time
+    (kept in CAMERA_CACHE) before checking 0 to max_index.
+    The camera stays open, so the caller doesn't reopen it.
+    Returns: (camera index, opened cv2.VideoCapture) or (None, None)
     """
+    cached = None
+    try:
+        with open(CAMERA_CACHE, 'r') as f:
+            cached = json.load(f)['index']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # No camera has worked yet
+    
+    indices = list(range(max_index))
+    if cached in indices:
+        indices.remove(cached)
+        indices.insert(0, cached)
+    
     print("Searching for available cameras...")
-    for index in range(max_index):
+    for index in indices:
         cap = cv2.VideoCapture(index)
         if cap.isOpened():
             # Try to read a frame to verify it actually works
             ret, _ = cap.read()
-            cap.release()
             if ret:
                 print(f"✓ Found working camera at index {index}")
-                return index
+                if index != cached:
+                    try:
+                        with open(CAMERA_CACHE, 'w') as f:
+                            json.dump({'index': index}, f)
+                    except OSError:
+                        pass  # Only costs a slower start next time
+                return index, cap
+        cap.release()
     print("✗ No working camera found")
-    return None
+    return None, None
+
+def prep_for_decode(gray, dst=None):
+    """
+    Otsu-binarize a grayscale image for pyzbar (into dst if given, which may
+    be gray itself): a threshold picked per image instead of a fixed one, so
+    codes still read under uneven lighting
+    """
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)
+    return binary
+
+def shrink(gray):
+    """Half-size copy of a grayscale image, each pixel the mean of a 2x2 block"""
+    return cv2.resize(gray, (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+
+def decode_center(frame, full_res=False):
+    """
+    Decode QR codes in the central ROI_FRACTION of the frame, where the code
+    sits at a scan position; pyzbar's work shrinks with the ROI area.
+    The ROI is decoded at half resolution (a quarter of the pixels), and
+    again at full resolution only if that finds nothing and full_res is set.
+    Returns: (decoded objects, (x, y) offset of the ROI, scale of the decoded
+    image coordinates to frame coordinates)
+    """
+    h, w = frame.shape[:2]
+    x0 = int(w * (1 - ROI_FRACTION) / 2)
+    y0 = int(h * (1 - ROI_FRACTION) / 2)
+    
+    # Converted to grey once, before the resize, so every later pass runs on
+    # one channel; the half-size image is binarized in place
+    gray = cv2.cvtColor(frame[y0:h - y0, x0:w - x0], cv2.COLOR_BGR2GRAY)
+    small = shrink(gray)
+    decoded_objects = decode(prep_for_decode(small, small))
+    if decoded_objects or not full_res:
+        return decoded_objects, (x0, y0), 2
+    return decode(prep_for_decode(gray, gray)), (x0, y0), 1
+
+def code_outline(obj, offset, scale):
+    """
+    Outline of a decoded QR code in frame coordinates, as an int32 point
+    array for cv2.polylines; the convex hull when pyzbar returns more than
+    the 4 corners
+    """
+    points = np.asarray(obj.polygon, dtype=np.int32) * scale + np.asarray(offset, dtype=np.int32)
+    if len(points) > 4:
+        points = cv2.convexHull(points)
+    return points
 
 def scan_qr_codes():
     """
@@ -142,19 +218,12 @@ def scan_qr_codes():
     grid = load_grid_from_csv(csv_file)
     print(f"Loaded {len(grid)} entries from {csv_file}")
     
-    # Find available camera
-    camera_index = find_available_camera()
-    if camera_index is None:
+    # Find and open an available camera
+    camera_index, cap = open_camera()
+    if cap is None:
         print("Error: Could not find any working camera")
         return
-    
-    # Initialize webcam with the found index
-    cap = cv2.VideoCapture(camera_index)
-    
-    # Check if camera opened successfully
-    if not cap.isOpened():
-        print("Error: Could not open webcam")
-        return
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep only the newest frame queued
     
     print("QR Code Scanner Started")
     print("Press 'q' to quit")
@@ -164,16 +233,31 @@ def scan_qr_codes():
     # Store previously detected codes to avoid repeated detections
     previous_data = None
     
+    last_decode = 0.0
+    last_found = time.monotonic()
     while True:
-        # Capture frame-by-frame
-        ret, frame = cap.read()
+        # Grab every frame so the driver queue never goes stale, but only
+        # retrieve and decode one every DECODE_INTERVAL
+        if not cap.grab():
+            print("Error: Failed to capture frame")
+            break
+        now = time.monotonic()
+        if now - last_decode < DECODE_INTERVAL:
+            continue
+        last_decode = now
+        
+        ret, frame = cap.retrieve()
         
         if not ret:
             print("Error: Failed to capture frame")
             break
         
-        # Decode QR codes in the frame
-        decoded_objects = decode(frame)
+        # Decode QR codes in the central ROI and mark the ROI on the preview
+        decoded_objects, (x0, y0), scale = decode_center(frame, now - last_found > FULL_RES_AFTER)
+        if decoded_objects:
+            last_found = now
+        h, w = frame.shape[:2]
+        cv2.rectangle(frame, (x0, y0), (w - x0, h - y0), (128, 128, 128), 1)
         
         # Process each detected QR code
         for obj in decoded_objects:
@@ -181,24 +265,14 @@ def scan_qr_codes():
             qr_data = obj.data.decode('utf-8')
             qr_type = obj.type
             
-            # Get the bounding box coordinates
-            points = obj.polygon
-            
-            # If the points do not form a quad, find convex hull
-            if len(points) > 4:
-                hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                points = hull
-            
             # Draw the bounding box around the QR code
-            n = len(points)
-            for j in range(n):
-                cv2.line(frame, tuple(points[j]), tuple(points[(j+1) % n]), (0, 255, 0), 3)
+            cv2.polylines(frame, [code_outline(obj, (x0, y0), scale)], True, (0, 255, 0), 3)
             
             # Draw a rectangle for the text background
-            x = obj.rect.left
-            y = obj.rect.top
-            w = obj.rect.width
-            h = obj.rect.height
+            x = obj.rect.left * scale + x0
+            y = obj.rect.top * scale + y0
+            w = obj.rect.width * scale
+            h = obj.rect.height * scale
             
             # Display the QR code type and data on the frame
             cv2.rectangle(frame, (x, y - 30), (x + w, y), (0, 255, 0), -1)
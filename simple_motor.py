@@ -3,80 +3,115 @@
 Simple motor control - set RPM and get distance in real-time
 """
 
+import collections
+import re
 import serial
+import threading
 import time
 
-# Connect to Arduino
-arduino = serial.Serial('/dev/ttyACM0', 115200, timeout=0.1)
-time.sleep(2)
+# Distances in a telemetry line, matched on the raw bytes
+DIST_PATTERN = re.compile(rb"Dist1\(cm\):(-?[\d.]+),Dist2\(cm\):(-?[\d.]+)")
 
-# Clear initial buffer
-arduino.flushInput()
+# Newest (d1, d2) reading. Appending to a maxlen=1 deque is atomic, so the
+# listener thread publishes into it without a lock.
+latest = collections.deque(maxlen=1)
+show_readings = threading.Event()  # Listener prints each reading while set
+stop_listening = threading.Event()
+
+def listen(arduino):
+    """Listener thread: parse telemetry into latest, printing it while show_readings is set"""
+    while not stop_listening.is_set():
+        m = DIST_PATTERN.search(arduino.readline())  # Blocks up to the read timeout
+        if m is None:
+            continue  # Timeout, command reply or partial line
+        try:
+            d1, d2 = float(m.group(1)), float(m.group(2))
+        except ValueError:
+            continue
+        latest.append((d1, d2))
+        if show_readings.is_set():
+            print(f"D1: {d1:.2f} cm, D2: {d2:.2f} cm")
+
+# Arduino connection, opened on first use so importing this module doesn't
+# grab the port or wait for the Arduino reset
+_arduino = None
+_listener = None
+
+def _get_arduino():
+    """Return (arduino, listener thread), connecting on the first call"""
+    global _arduino, _listener
+    if _arduino is None:
+        arduino = serial.Serial('/dev/ttyACM0', 115200, timeout=0.1)
+        time.sleep(2)
+        
+        # Clear initial buffer
+        arduino.flushInput()
+        
+        # Parse telemetry on the listener thread from here on
+        _listener = threading.Thread(target=listen, args=(arduino,), daemon=True)
+        _listener.start()
+        _arduino = arduino
+    return _arduino, _listener
+
+def close():
+    """Stop the listener and close the connection, if it was opened"""
+    global _arduino, _listener
+    if _arduino is None:
+        return
+    stop_listening.set()
+    _listener.join()
+    _arduino.close()
+    _arduino = _listener = None
+    stop_listening.clear()
+    print("Connection closed")
 
 # Set RPM
 def setRPM(rpm1, rpm2):
+    arduino, _ = _get_arduino()
     arduino.write(f"{rpm1},{rpm2}\n".encode())
 
-# Get distance
+# Get distance (newest reading from the listener thread)
 def getDist():
-    if arduino.in_waiting > 0:
-        line = arduino.readline().decode().strip()
-        if "Dist1(cm):" in line:
-            parts = line.split(',')
-            for part in parts:
-                if "Dist1(cm):" in part:
-                    d1 = float(part.split(':')[1])
-                elif "Dist2(cm):" in part:
-                    d2 = float(part.split(':')[1])
-            return d1, d2
+    _get_arduino()  # Make sure the listener is running
+    if latest:
+        return latest[-1]
     return None, None
 
+def run(rpm1, rpm2, duration):
+    """Run the motors for duration seconds while the listener prints the distances"""
+    setRPM(rpm1, rpm2)
+    show_readings.set()
+    time.sleep(duration)
+    show_readings.clear()
+
 # Main
-try:
-    # Forward 5 seconds
-    print("Forward 15 RPM for 5 seconds...")
-    setRPM(15, 15)
-    time.sleep(0.2)  # Wait for Arduino response
-    arduino.flushInput()  # Clear the response
-    
-    start = time.time()
-    while time.time() - start < 5:
-        d1, d2 = getDist()
-        if d1 is not None:
-            print(f"D1: {d1:.2f} cm, D2: {d2:.2f} cm")
-    
-    # Stop 2 seconds
-    print("\nStopping for 2 seconds...")
-    setRPM(0, 0)
-    time.sleep(0.2)  # Wait for Arduino response
-    arduino.flushInput()  # Clear the response
-    time.sleep(1.8)  # Rest of 2 seconds
-    
-    # Reverse 5 seconds
-    print("\nReverse -15 RPM for 5 seconds...")
-    setRPM(-15, -15)
-    time.sleep(0.2)  # Wait for Arduino response
-    arduino.flushInput()  # Clear the response
-    
-    start = time.time()
-    while time.time() - start < 5:
-        d1, d2 = getDist()
-        if d1 is not None:
-            print(f"D1: {d1:.2f} cm, D2: {d2:.2f} cm")
-    
-    # Final stop
-    print("\nFinal stop...")
-    setRPM(0, 0)
-    time.sleep(0.2)
-    
-    print("\nDone!")
-    
-except KeyboardInterrupt:
-    print("\nInterrupted!")
-    setRPM(0, 0)
-except Exception as e:
-    print(f"\nError: {e}")
-    setRPM(0, 0)
-finally:
-    arduino.close()
-    print("Connection closed")
+if __name__ == "__main__":
+    try:
+        # Forward 5 seconds
+        print("Forward 15 RPM for 5 seconds...")
+        run(15, 15, 5)
+        
+        # Stop 2 seconds
+        print("\nStopping for 2 seconds...")
+        setRPM(0, 0)
+        time.sleep(2)
+        
+        # Reverse 5 seconds
+        print("\nReverse -15 RPM for 5 seconds...")
+        run(-15, -15, 5)
+        
+        # Final stop
+        print("\nFinal stop...")
+        setRPM(0, 0)
+        time.sleep(0.2)
+        
+        print("\nDone!")
+        
+    except KeyboardInterrupt:
+        print("\nInterrupted!")
+        setRPM(0, 0)
+    except Exception as e:
+        print(f"\nError: {e}")
+        setRPM(0, 0)
+    finally:
+        close()
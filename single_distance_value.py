@@ -56,11 +56,11 @@ def send_rpm_get_distance(ser, targetRpm1, targetRpm2):
         ser.write(message.encode('utf-8'))
         print(f"Sent to Arduino - RPM1: {targetRpm1}, RPM2: {targetRpm2}")
         
-        # Wait for response
-        time.sleep(0.15)  # Small delay for Arduino to process
+        # Wait for response; readline returns as soon as the line arrives,
+        # or empty after the port's read timeout
+        response = ser.readline().decode('utf-8').strip()
         
-        if ser.in_waiting > 0:
-            response = ser.readline().decode('utf-8').strip()
+        if response:
             # Parse the response (distanceCm1,distanceCm2)
             distances = response.split(',')
             if len(distances) == 2:
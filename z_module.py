@@ -3,12 +3,26 @@
 Z-axis motor controller with manual distance control.
 Combined Motor, Controller, and API functions in one file.
 """
+import atexit
+import functools
+import os
+import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import RPi.GPIO as GPIO
-except Exception:
+# Only a Pi has GPIO; elsewhere the stub is used without trying RPi.GPIO
+# or pigpiod at all
+_ON_PI = sys.platform.startswith('linux') and os.path.exists('/sys/class/gpio')
+
+GPIO = None
+if _ON_PI:
+    try:
+        import RPi.GPIO as GPIO
+    except Exception:
+        GPIO = None
+
+if GPIO is None:
     # Stub for dev 
     class _FakePWM:
         def __init__(self, pin, freq):
@@ -32,8 +46,20 @@ except Exception:
 
     GPIO = _FakeGPIO()
 
+# Hardware PWM through pigpiod when it's running, so the duty cycle is
+# generated by the PWM peripheral instead of RPi.GPIO's software timing
+_pi = None
+if _ON_PI:
+    try:
+        import pigpio
+        _pi = pigpio.pi()
+        if not _pi.connected:
+            _pi = None
+    except Exception:
+        _pi = None
+
 # Z-axis motor pins (BCM)
-Z_PWM_PIN = 13
+Z_PWM_PIN = 13  # PWM1, so it can use hardware PWM
 Z_DIR_PIN = 19
 PWM_FREQ = 1000  # Hz
 Z_SPEED = 100  # percent duty cycle
@@ -42,15 +68,142 @@ Z_SPEED = 100  # percent duty cycle
 RAMP_TIME = 0.5
 RAMP_STEPS = 50
 STEP_DELAY = RAMP_TIME / RAMP_STEPS
+SPIN_TIME = 0.002  # Last part of each step busy-waited, past sleep's wakeup jitter (0 = sleep only)
+
+# The ramp worker thread runs SCHED_FIFO at this priority, so GUI, camera
+# and GC work can't preempt a ramp (Linux, needs CAP_SYS_NICE or sudo)
+RAMP_RT_PRIORITY = 10
+
+# A move still running this long past its planned time (seconds) is
+# stopped by a watchdog, in case the move thread stalls or dies
+MOVE_WATCHDOG_MARGIN = 1.0
 
 # Z-axis speed calibration
 Z_SPEED_AT_100_PERCENT = 10  # cm/sec at 100% duty cycle
 
+# pigpio hardware_PWM duty range (100% = 1,000,000)
+PWM_RANGE = 1_000_000
+
+# Duty cycles are written rounded to this (percent); steps of a short ramp
+# that round to the value already set aren't written at all
+DUTY_RESOLUTION = 0.1
+
+# Kernel PWM (sysfs), used when pigpiod isn't running (it doesn't run on a
+# Pi 5). The pin has to be muxed to PWM by an overlay, e.g. on a Pi 4
+# "dtoverlay=pwm-2chan,pin=12,func=4,pin2=13,func2=4" (pwmchip0); on a Pi 5
+# set PWM_CHIP = 2 and use the RP1 channels (GPIO 12-19 -> 0-3, twice)
+PWM_SYSFS = '/sys/class/pwm'
+PWM_CHIP = 0
+PWM_CHANNELS = {12: 0, 13: 1, 18: 0, 19: 1}  # BCM pin -> channel
+
 # Global motor and controller instances
 _z_motor = None
 _z_controller = None
 
 
+def _make_ramp_thread_realtime():
+    """Executor initializer: move the calling ramp worker thread to SCHED_FIFO"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(RAMP_RT_PRIORITY))
+    except (OSError, AttributeError) as ex:
+        print(f"Z ramp thread not real-time: {ex}")
+
+
+def high_precision_sleep(deadline, stop_evt=None):
+    """
+    Sleep until the time.perf_counter() deadline: an ordinary sleep to
+    SPIN_TIME before it, then a busy-wait for the rest, past the wakeup
+    jitter of sleep. Returns early if stop_evt gets set.
+    Returns: True if stopped by stop_evt, False at the deadline
+    """
+    coarse = deadline - SPIN_TIME - time.perf_counter()
+    if stop_evt is None:
+        if coarse > 0:
+            time.sleep(coarse)
+        while time.perf_counter() < deadline:
+            pass
+        return False
+    
+    if stop_evt.wait(max(0.0, coarse)):
+        return True
+    while time.perf_counter() < deadline:
+        if stop_evt.is_set():
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=32)
+def _ramp_schedule(start, target):
+    """
+    Duty cycle for each of the RAMP_STEPS + 1 ramp steps from start to target.
+    Cached: moves mostly repeat the same ramps (0 to Z_SPEED and back), so
+    each schedule is worked out only once.
+    """
+    diff = target - start
+    return tuple(start + diff * step / RAMP_STEPS for step in range(RAMP_STEPS + 1))
+
+
+class _HardwarePWM:
+    """pigpio hardware PWM with the RPi.GPIO PWM methods Motor uses"""
+    def __init__(self, pin, freq):
+        self.pin = pin
+        self.freq = freq
+        _pi.set_mode(pin, pigpio.OUTPUT)
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+
+    def ChangeDutyCycle(self, duty):
+        _pi.hardware_PWM(self.pin, self.freq, int(duty * PWM_RANGE / 100))
+
+    def stop(self):
+        _pi.hardware_PWM(self.pin, 0, 0)
+
+
+class _SysfsPWM:
+    """
+    Kernel PWM channel through sysfs, with the RPi.GPIO PWM methods Motor
+    uses. The duty_cycle file stays open, so each change is one write.
+    """
+    def __init__(self, pin, freq):
+        self.path = f"{PWM_SYSFS}/pwmchip{PWM_CHIP}/pwm{PWM_CHANNELS[pin]}"
+        if not os.path.exists(self.path):
+            self._write(f"{PWM_SYSFS}/pwmchip{PWM_CHIP}/export", PWM_CHANNELS[pin])
+            # udev may take a moment to create the channel with permissions
+            deadline = time.monotonic() + 1.0
+            while not os.access(f"{self.path}/period", os.W_OK):
+                if time.monotonic() > deadline:
+                    raise OSError(f"{self.path} not writable")
+                time.sleep(0.01)
+        
+        self.period = int(1e9 / freq)  # ns
+        self._write(f"{self.path}/duty_cycle", 0)  # Duty must stay <= period
+        self._write(f"{self.path}/period", self.period)
+        self._duty_fd = os.open(f"{self.path}/duty_cycle", os.O_WRONLY)
+
+    @staticmethod
+    def _write(path, value):
+        with open(path, 'w') as f:
+            f.write(str(value))
+
+    def start(self, duty):
+        self.ChangeDutyCycle(duty)
+        self._write(f"{self.path}/enable", 1)
+
+    def ChangeDutyCycle(self, duty):
+        if self._duty_fd is None:
+            return  # Stopped; the fd is closed and its number may be reused
+        os.pwrite(self._duty_fd, str(int(self.period * duty / 100)).encode(), 0)
+
+    def stop(self):
+        if self._duty_fd is None:
+            return
+        self.ChangeDutyCycle(0)
+        self._write(f"{self.path}/enable", 0)
+        os.close(self._duty_fd)
+        self._duty_fd = None
+
+
 class Motor:
     """Motor control class for Z-axis"""
     def __init__(self, pwm_pin, dir_pin):
@@ -58,62 +211,139 @@ class Motor:
         self.dir_pin = dir_pin
         self.current_speed = 0.0
         self.target_speed = 0.0
-        self.ramp_thread = None
-        self.stop_requested = False
-
-        GPIO.setup(self.pwm_pin, GPIO.OUT)
-        GPIO.setup(self.dir_pin, GPIO.OUT)
-        GPIO.output(self.dir_pin, GPIO.LOW)
-
-        self.pwm = GPIO.PWM(self.pwm_pin, PWM_FREQ)
+        
+        # Ramps run one at a time on a single long-lived worker; setting
+        # _stop_evt preempts the running one. Each request bumps _gen, so a
+        # queued ramp that has been superseded never starts.
+        self._exec = ThreadPoolExecutor(max_workers=1, initializer=_make_ramp_thread_realtime)
+        self._stop_evt = threading.Event()
+        self._gen = 0
+        self._estop = threading.Event()  # Set by stop_immediate() until the next ramp
+        # Held from a ramp's stop check to its duty write, so once
+        # stop_immediate() has written 0 no ramp step can overwrite it
+        self._pwm_lock = threading.Lock()
+        self._duty_ticks = 0  # Last duty cycle written, in DUTY_RESOLUTION steps
+
+        # Hardware PWM if possible: pigpiod, then the kernel PWM driver,
+        # then RPi.GPIO's software PWM. With pigpiod the direction pin goes
+        # through it too, so only one library touches the motor's pins.
+        self._use_pigpio = _pi is not None
+        if self._use_pigpio:
+            _pi.set_mode(self.dir_pin, pigpio.OUTPUT)
+            self._dir_levels = (0, 1)
+            self._dir_write = functools.partial(_pi.write, self.dir_pin)
+        else:
+            GPIO.setup(self.dir_pin, GPIO.OUT)
+            self._dir_levels = (GPIO.LOW, GPIO.HIGH)
+            self._dir_write = functools.partial(GPIO.output, self.dir_pin)
+        self._dir_write(self._dir_levels[0])
+        self._dir = 0  # Last direction written: 1 UP, 0 otherwise
+
+        self.pwm = None
+        if self._use_pigpio:
+            self.pwm = _HardwarePWM(self.pwm_pin, PWM_FREQ)
+        elif _ON_PI and self.pwm_pin in PWM_CHANNELS \
+                and os.path.isdir(f"{PWM_SYSFS}/pwmchip{PWM_CHIP}"):
+            try:
+                self.pwm = _SysfsPWM(self.pwm_pin, PWM_FREQ)
+            except OSError as ex:
+                print(f"Kernel PWM unavailable ({ex}), using software PWM")
+        if self.pwm is None:
+            GPIO.setup(self.pwm_pin, GPIO.OUT)
+            self.pwm = GPIO.PWM(self.pwm_pin, PWM_FREQ)
         self.pwm.start(0)
 
     def set_direction(self, direction):
-        GPIO.output(self.dir_pin, GPIO.HIGH if direction == 1 else GPIO.LOW)
+        """Set the direction pin (1 UP, anything else DOWN), skipping the write if unchanged"""
+        level = 1 if direction == 1 else 0
+        if level != self._dir:
+            self._dir_write(self._dir_levels[level])
+            self._dir = level
 
     def ramp_to_speed(self, target_speed, direction):
-        self.stop_requested = True
-        if self.ramp_thread and self.ramp_thread.is_alive():
-            self.ramp_thread.join(timeout=0.1)
-        self.stop_requested = False
-
-        self.target_speed = max(0.0, min(100.0, float(abs(target_speed))))
-        self.set_direction(direction)
-
-        def ramp():
-            start = self.current_speed
-            diff = self.target_speed - start
-            for step in range(RAMP_STEPS + 1):
-                if self.stop_requested:
+        """
+        Ramp to target_speed (percent) in direction. Returns at once: the
+        running ramp is preempted, and this one takes over on the ramp
+        worker as soon as it has stopped.
+        """
+        target_speed = max(0.0, min(100.0, float(abs(target_speed))))
+        self._estop.clear()
+        with self._pwm_lock:
+            self._gen += 1
+            gen = self._gen
+            self._stop_evt.set()
+        self._exec.submit(self._ramp, gen, target_speed, direction)
+
+    def _ramp(self, gen, target_speed, direction):
+        """Ramp worker: step the duty cycle along the schedule, each step on its own deadline"""
+        with self._pwm_lock:
+            if gen != self._gen:
+                return  # Superseded or stopped before it started
+            self._stop_evt.clear()
+            self.target_speed = target_speed
+            self.set_direction(direction)
+            schedule = _ramp_schedule(self.current_speed, target_speed)
+
+        # Deadlines keep sleep overshoot from adding up and stretching the
+        # ramp. A PWM error ends the ramp and is reported, rather than being
+        # swallowed at every step.
+        t0 = time.perf_counter()
+        try:
+            for step, new_speed in enumerate(schedule, 1):
+                with self._pwm_lock:
+                    if self._stop_evt.is_set():
+                        break
+                    self.current_speed = new_speed
+                    self._write_duty(new_speed)
+                # Returns True at once when preempted
+                if high_precision_sleep(t0 + step * STEP_DELAY, self._stop_evt):
                     break
-                frac = step / RAMP_STEPS
-                new_speed = start + diff * frac
-                self.current_speed = new_speed
-                try:
-                    self.pwm.ChangeDutyCycle(new_speed)
-                except Exception:
-                    pass
-                time.sleep(STEP_DELAY)
-            if not self.stop_requested:
-                self.current_speed = self.target_speed
-
-        self.ramp_thread = threading.Thread(target=ramp, daemon=True)
-        self.ramp_thread.start()
+        except Exception as ex:
+            print(f"Ramp error: {ex}")
+            return
+        if not self._stop_evt.is_set():
+            self.current_speed = self.target_speed
+
+    def _write_duty(self, duty):
+        """
+        Write duty, rounded to DUTY_RESOLUTION, to the PWM unless it's
+        already set (a ramp's first step repeats the current speed, a ramp
+        to the current speed is flat, and short ramps repeat rounded values)
+        """
+        ticks = round(duty / DUTY_RESOLUTION)  # Integer, so repeats compare exactly
+        if ticks == self._duty_ticks:
+            return
+        self.pwm.ChangeDutyCycle(ticks / (1 / DUTY_RESOLUTION))
+        self._duty_ticks = ticks
+
+    def sleep_until(self, deadline):
+        """
+        Sleep until the time.perf_counter() deadline, or until stop_immediate().
+        Returns: True if stopped early
+        """
+        return high_precision_sleep(deadline, self._estop)
 
     def stop_smooth(self):
         self.ramp_to_speed(0, 1)
 
     def stop_immediate(self):
-        self.stop_requested = True
-        self.current_speed = 0.0
-        self.target_speed = 0.0
-        try:
-            self.pwm.ChangeDutyCycle(0)
-        except Exception:
-            pass
+        self._estop.set()
+        self._stop_evt.set()
+        with self._pwm_lock:
+            self._gen += 1  # Cancels any ramp still queued
+            self.current_speed = 0.0
+            self.target_speed = 0.0
+            # Always written, even if 0 is believed set already; the PWM
+            # may already be stopped during cleanup
+            self._duty_ticks = None
+            try:
+                self._write_duty(0.0)
+            except Exception:
+                pass
 
     def cleanup(self):
         self.stop_immediate()
+        self._exec.shutdown(wait=True)
         try:
             self.pwm.stop()
         except Exception:
@@ -153,16 +383,32 @@ class ZAxisController:
         )
         self.move_thread.start()
 
+    def _watchdog_stop(self):
+        print("Watchdog: move overran, stopping Z motor")
+        self.motor.stop_immediate()
+
     def _execute_move(self, duration, direction, speed_percent, distance_cm):
+        # Independent of this thread, so the motor stops even if it stalls
+        watchdog = threading.Timer(duration + RAMP_TIME + MOVE_WATCHDOG_MARGIN, self._watchdog_stop)
+        watchdog.daemon = True
+        watchdog.start()
         try:
+            t0 = time.perf_counter()
             self.motor.ramp_to_speed(speed_percent, direction)
-            time.sleep(duration)
+            # An emergency stop ends the move at once, not after duration
+            stopped = self.motor.sleep_until(t0 + duration)
             self.motor.stop_immediate()
+            if stopped:
+                # Rough distance covered, from the time spent moving
+                distance_cm *= min(1.0, (time.perf_counter() - t0) / duration)
+                print(f"Move stopped after ~{distance_cm:.2f} cm")
             self.current_position += distance_cm * direction
             print(f"Move complete. Current position: {self.current_position:.2f} cm")
         except Exception as ex:
             print(f"Move error: {ex}")
+            self.motor.stop_immediate()
         finally:
+            watchdog.cancel()
             self.moving = False
 
 
@@ -179,6 +425,14 @@ def init_z_axis():
     print("Z-axis initialized")
 
 
+# Hardware and kernel PWM keep running after the process exits, so the
+# motor is stopped on the way out even if cleanup_z_axis() never ran
+@atexit.register
+def _stop_z_axis_at_exit():
+    if _z_motor is not None:
+        _z_motor.stop_immediate()
+
+
 def z_axis(distance, direction):
     """
     Move Z-axis motor.
@@ -202,15 +456,56 @@ def z_axis(distance, direction):
     _z_controller.move_distance(distance, direction=dir_value, speed_percent=100)
 
 
+def wait_z_axis(timeout=None):
+    """
+    Block until the current Z-axis move (if any) has finished.
+    
+    Args:
+        timeout: Longest wait in seconds (None waits for the move to end)
+    
+    Returns:
+        True if the axis is idle, False if the timeout ran out first
+    """
+    if _z_controller is None or _z_controller.move_thread is None:
+        return True
+    _z_controller.move_thread.join(timeout)
+    return not _z_controller.move_thread.is_alive()
+
+
 def cleanup_z_axis():
     """Cleanup Z-axis resources. Call this at shutdown."""
-    global _z_motor
+    global _z_motor, _z_controller
     if _z_motor:
         _z_motor.cleanup()
         GPIO.cleanup()
+        _z_motor = _z_controller = None  # Already stopped; skip the exit hook
         print("Z-axis cleanup complete")
 
 
+def _prompt_move(direction):
+    """Ask for a distance and move the Z-axis that far in direction (1 UP, 0 DOWN)"""
+    try:
+        distance = float(input("Enter distance (cm): "))
+        z_axis(distance, direction)
+    except ValueError:
+        print("Invalid distance value")
+
+
+def _emergency_stop():
+    if _z_motor:
+        _z_motor.stop_immediate()
+    print("Emergency stop activated")
+
+
+# Menu choices for main(): key -> (label, action); "4" quits
+MENU = {
+    "1": ("Move UP", lambda: _prompt_move(1)),
+    "2": ("Move DOWN", lambda: _prompt_move(0)),
+    "3": ("Emergency Stop", _emergency_stop),
+    "4": ("Quit", None),
+}
+
+
 def main():
     """Interactive menu for manual control"""
     init_z_axis()
@@ -219,41 +514,23 @@ def main():
     print("Z-Axis Motor Controller")
     print("=" * 50)
 
+    # Options are printed once, and again only after an invalid choice
+    options = "\nOptions:\n" + "\n".join(f"  {key} - {label}" for key, (label, _) in MENU.items())
+    print(options)
+
     try:
         while True:
-            print("\nOptions:")
-            print("  1 - Move UP")
-            print("  2 - Move DOWN")
-            print("  3 - Emergency Stop")
-            print("  4 - Quit")
-            
             choice = input("\nEnter choice (1-4): ").strip()
 
-            if choice == "1":
-                try:
-                    distance = float(input("Enter distance (cm): "))
-                    z_axis(distance, 1)
-                except ValueError:
-                    print("Invalid distance value")
-            
-            elif choice == "2":
-                try:
-                    distance = float(input("Enter distance (cm): "))
-                    z_axis(distance, 0)
-                except ValueError:
-                    print("Invalid distance value")
-            
-            elif choice == "3":
-                if _z_motor:
-                    _z_motor.stop_immediate()
-                print("Emergency stop activated")
-            
-            elif choice == "4":
+            if choice == "4":
                 print("Quitting...")
                 break
             
+            if choice in MENU:
+                MENU[choice][1]()
             else:
                 print("Invalid choice")
+                print(options)
 
     except KeyboardInterrupt:
         print("\nInterrupted by user")
@@ -261,7 +538,6 @@ def main():
     finally:
         cleanup_z_axis()
 
-
 if __name__ == "__main__":
     try:
         main()
@@ -1,17 +1,20 @@
-from z_module import init_z_axis, z_axis, cleanup_z_axis
+from z_module import init_z_axis, z_axis, wait_z_axis, cleanup_z_axis
 import time
 
+# Test moves as (distance cm, direction: 1 UP / 0 DOWN)
+MOVES = [(15, 1), (15, 0)]
+
+# Pause after each move has finished, for the axis to come to rest
+SETTLE = 0.2  # seconds
+
 # Initialize once at start
 init_z_axis()
 
 try:
-    # Move 50 cm UP
-    z_axis(15, 1)
-    time.sleep(2)
-    
-    # Move 30 cm DOWN
-    z_axis(15, 0)
-    time.sleep(2)
+    for distance, direction in MOVES:
+        z_axis(distance, direction)
+        wait_z_axis()  # z_axis returns as soon as the move has started
+        time.sleep(SETTLE)
     
 finally:
     cleanup_z_axis()
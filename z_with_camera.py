@@ -3,11 +3,24 @@
 Z-Axis Controller with Camera Feed
 Controls Z-axis position from 31 cm to 185 cm with live camera view
 31 cm is the offset (home position)
+
+Set Z_CAM_INDEX to the camera's device index to skip probing for it.
 """
 
 import cv2
-from z_module import init_z_axis, z_axis, cleanup_z_axis
+import numpy as np
+import os
+import queue
+import sys
+from z_module import init_z_axis, z_axis, wait_z_axis, cleanup_z_axis
 import threading
+import time
+
+# CSI camera modules through picamera2 on a Pi; USB cameras through OpenCV
+try:
+    from picamera2 import Picamera2, MappedArray
+except Exception:
+    Picamera2 = None
 
 class ZAxisController:
     def __init__(self):
@@ -19,44 +32,180 @@ class ZAxisController:
         # Current position (starts at offset)
         self.current_position = self.OFFSET
         
+        # Camera feed: capture size, and how often a frame is converted and
+        # shown (every frame is still grabbed so the view never lags)
+        self.CAMERA_WIDTH = 480
+        self.CAMERA_HEIGHT = 360
+        self.CAMERA_FPS = 30
+        self.DISPLAY_INTERVAL = 1 / 15  # seconds
+        
+        # Camera probing: only the first few indices are tried, through the
+        # platform's native backend rather than letting OpenCV negotiate one
+        self.CAMERA_PROBE = 3
+        if sys.platform.startswith('linux'):
+            self.CAMERA_BACKEND = cv2.CAP_V4L2
+        elif sys.platform == 'win32':
+            self.CAMERA_BACKEND = cv2.CAP_DSHOW
+        else:
+            self.CAMERA_BACKEND = cv2.CAP_ANY
+        
         # Initialize Z-axis
         print("Initializing Z-axis...")
         init_z_axis()
         
         # Initialize camera
         self.cap = None
+        self._picam = None
         self.running = True
-        self.init_camera()
         
-    def init_camera(self):
-        """Initialize camera"""
+        # Latest-frame slot filled by the camera thread, so the feed window
+        # never waits on the driver
+        self._latest = None
+        self._frame_lock = threading.Lock()
+        self._frame_ready = threading.Event()  # Set while _latest hasn't been shown
+        self._cam_stop = threading.Event()
+        self._cam_thread = None
+        
+        # Two frame buffers retrieved into in turn, so no image is allocated
+        # per frame; the feed only ever holds the one not being written
+        self._frame_bufs = [None, None]
+        self._buf_index = 0
+        
+        # Cameras that ignore the requested size are scaled into this buffer
+        # for display, instead of a new array per frame
+        self._display_buf = np.empty((self.CAMERA_HEIGHT, self.CAMERA_WIDTH, 3), dtype=np.uint8)
+        
+        self.init_camera(int(os.environ.get('Z_CAM_INDEX', 0)))
+        
+        # Next target for the motor thread; a newer target replaces one that
+        # hasn't started yet, so only the latest request is driven to
+        self._target_q = queue.Queue(maxsize=1)
+        self._motor_thread = None
+        
+    def init_camera(self, preferred_index=0):
+        """
+        Initialize camera: a CSI camera if picamera2 finds one, else USB
+        cameras from preferred_index on
+        """
+        if Picamera2 is not None and Picamera2.global_camera_info():
+            try:
+                picam = Picamera2()
+                config = picam.create_video_configuration(
+                    main={'size': (self.CAMERA_WIDTH, self.CAMERA_HEIGHT), 'format': 'RGB888'},
+                    buffer_count=2)
+                picam.configure(config)
+                picam.start()
+            except Exception as e:
+                print(f"✗ CSI camera failed ({e}), trying USB cameras")
+            else:
+                self._picam = picam
+                print(f"✓ CSI camera initialized ({self.CAMERA_WIDTH}x{self.CAMERA_HEIGHT})")
+                
+                self._cam_thread = threading.Thread(target=self._cam_worker, daemon=True)
+                self._cam_thread.start()
+                return
+        
         print("Searching for camera...")
-        for i in range(10):
-            cap = cv2.VideoCapture(i)
+        indices = [preferred_index] + [i for i in range(self.CAMERA_PROBE) if i != preferred_index]
+        for i in indices:
+            cap = cv2.VideoCapture(i, self.CAMERA_BACKEND)
             if cap.isOpened():
                 ret, _ = cap.read()
                 if ret:
+                    # Keep one frame queued, and have the camera send MJPG at
+                    # the display size instead of raw full-size frames (the
+                    # format has to be set before the size for V4L2)
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.CAMERA_WIDTH)
+                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.CAMERA_HEIGHT)
+                    cap.set(cv2.CAP_PROP_FPS, self.CAMERA_FPS)
                     self.cap = cap
-                    print(f"✓ Camera initialized at index {i}")
+                    
+                    # What the camera agreed to; other sizes are scaled for display
+                    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+                    fourcc = ''.join(chr((fourcc >> (8 * k)) & 0xFF) for k in range(4))
+                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                    print(f"✓ Camera initialized at index {i} ({width}x{height} {fourcc})")
+                    
+                    self._cam_thread = threading.Thread(target=self._cam_worker, daemon=True)
+                    self._cam_thread.start()
                     return
                 cap.release()
         print("✗ No camera found")
     
+    def _read_picam(self, buf):
+        """
+        Wait for the next CSI camera frame. Unless the feed still has the last
+        one, copy it straight out of the camera's DMA buffer into buf.
+        Returns: (True, frame) or (False, None) if the frame was skipped
+        """
+        with self._picam.captured_request() as request:
+            if self._frame_ready.is_set():
+                return False, None  # Feed hasn't shown the last frame yet
+            with MappedArray(request, 'main') as m:
+                if buf is None or buf.shape != m.array.shape:
+                    return True, m.array.copy()
+                np.copyto(buf, m.array)
+                return True, buf
+    
+    def _cam_worker(self):
+        """
+        Camera thread: grab every frame so the view never lags, but only
+        retrieve (decode) one into the latest-frame slot once the feed has
+        shown the previous one (a CSI camera's frames are just skipped)
+        """
+        while not self._cam_stop.is_set():
+            if self._picam is not None:
+                ret, frame = self._read_picam(self._frame_bufs[self._buf_index])
+            else:
+                if not self.cap.grab():
+                    self._cam_stop.wait(0.01)  # Camera stalled; don't spin
+                    continue
+                if self._frame_ready.is_set():
+                    continue  # Feed hasn't shown the last frame yet
+                
+                # retrieve() decodes into the buffer in place once it has the
+                # frame's size (the first frame into each allocates it)
+                ret, frame = self.cap.retrieve(self._frame_bufs[self._buf_index])
+            if ret:
+                self._frame_bufs[self._buf_index] = frame
+                self._buf_index ^= 1
+                with self._frame_lock:
+                    self._latest = frame
+                self._frame_ready.set()
+    
     def camera_feed(self):
-        """Display camera feed in separate window"""
-        if self.cap is None:
+        """Display camera feed in separate window, one frame per DISPLAY_INTERVAL"""
+        if self.cap is None and self._picam is None:
             print("No camera available")
             return
         
+        # Window sized once to the display buffer; every frame shown has
+        # that size, so imshow only repaints and never relayouts
         cv2.namedWindow('Camera Feed', cv2.WINDOW_NORMAL)
+        cv2.resizeWindow('Camera Feed', self.CAMERA_WIDTH, self.CAMERA_HEIGHT)
         
         while self.running:
-            ret, frame = self.cap.read()
-            if ret:
+            next_show = time.monotonic() + self.DISPLAY_INTERVAL
+            if self._frame_ready.wait(self.DISPLAY_INTERVAL):
+                with self._frame_lock:
+                    frame = self._latest
+                self._frame_ready.clear()
+                if frame.shape[:2] != self._display_buf.shape[:2]:
+                    frame = cv2.resize(frame, (self.CAMERA_WIDTH, self.CAMERA_HEIGHT),
+                                       dst=self._display_buf, interpolation=cv2.INTER_AREA)
                 cv2.imshow('Camera Feed', frame)
             
-            # Break on 'q' key
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            # Handle window events until the next frame is due; break on 'q' key
+            wait_ms = max(1, int((next_show - time.monotonic()) * 1000))
+            if cv2.waitKey(wait_ms) & 0xFF == ord('q'):
+                break
+            
+            # Window closed: stop drawing rather than reopen it every frame
+            # (the camera thread then only grabs, without decoding)
+            if cv2.getWindowProperty('Camera Feed', cv2.WND_PROP_VISIBLE) < 1:
                 break
         
         cv2.destroyAllWindows()
@@ -87,19 +236,45 @@ class ZAxisController:
         # Move Z-axis
         print(f"Moving {direction_text} {distance:.1f} cm...")
         z_axis(distance, direction)
+        wait_z_axis()  # z_axis only starts the move
         
         # Update current position
         self.current_position = target_position
         print(f"✓ Moved {direction_text} {distance:.1f} cm - Now at {self.current_position:.1f} cm")
         return True
     
+    def request_position(self, target_position):
+        """Queue a move for the motor thread, replacing any move still waiting"""
+        if target_position < self.MIN_POS or target_position > self.MAX_POS:
+            print(f"✗ Error: Position must be between {self.MIN_POS} and {self.MAX_POS} cm")
+            return False
+        
+        try:
+            self._target_q.get_nowait()  # Drop the stale target
+        except queue.Empty:
+            pass
+        self._target_q.put_nowait(target_position)
+        return True
+    
+    def _motor_worker(self):
+        """Motor thread: move to each queued target in turn, until a None target"""
+        while True:
+            target = self._target_q.get()
+            if target is None:
+                break
+            self.move_to_position(target)
+    
     def run(self):
         """Main control loop"""
         # Start camera feed in separate thread
-        if self.cap is not None:
+        if self.cap is not None or self._picam is not None:
             camera_thread = threading.Thread(target=self.camera_feed, daemon=True)
             camera_thread.start()
         
+        # Moves run on their own thread, so the prompt is back while moving
+        self._motor_thread = threading.Thread(target=self._motor_worker, daemon=True)
+        self._motor_thread.start()
+        
         print("\n" + "="*50)
         print("Z-Axis Position Controller")
         print("="*50)
@@ -118,7 +293,7 @@ class ZAxisController:
                 
                 try:
                     target = float(user_input)
-                    self.move_to_position(target)
+                    self.request_position(target)
                 except ValueError:
                     print("✗ Invalid input. Please enter a number.")
         
@@ -130,8 +305,22 @@ class ZAxisController:
     def cleanup(self):
         """Cleanup resources"""
         self.running = False
+        if self._motor_thread is not None:
+            # Let the current move finish, but skip any still waiting
+            try:
+                self._target_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._target_q.put(None)
+            self._motor_thread.join()
+        self._cam_stop.set()
+        if self._cam_thread is not None:
+            self._cam_thread.join(timeout=1.0)  # Stop grabbing before releasing
         if self.cap is not None:
             self.cap.release()
+        if self._picam is not None:
+            self._picam.stop()
+            self._picam.close()
         cv2.destroyAllWindows()
         cleanup_z_axis()
         print("Cleanup complete")